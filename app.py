@@ -1,9 +1,199 @@
-import pygame
-from game import Game
+import argparse
+
+from numpy import random
+
+import checkpoint
+from checkpoint import Checkpointer
+from evaluation import Evaluator
+from genetic import Population
+from instruments import Instruments
+from islands import TOPOLOGIES, Archipelago
+from objects import COLUMNS, ROWS, SPARSE_AREA
+from optimizers import OPTIMIZERS, EvolutionStrategy, GeneticOptimizer
+from recording import Recorder
+from snake import Rules
+
+
+# snake's features and moves fix the sizes of the first and last layers
+INPUTS, OUTPUTS = 12, 3
+
+
+def parse_layers(text):
+    """ parses layer sizes written as comma separated integers, such as 12,16,16,3 """
+    try:
+        layers = tuple(int(size) for size in text.split(','))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'{text} is not a comma separated list of layer sizes')
+    if len(layers) < 2 or layers[0] != INPUTS or layers[-1] != OUTPUTS or min(layers) < 1:
+        raise argparse.ArgumentTypeError(f'layers must start with {INPUTS} inputs and end with {OUTPUTS} outputs')
+    return layers
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(description='Snake learning to play through neural networks and genetic algorithm')
+    parser.add_argument('--headless', action='store_true', help='evolve without a window, evaluating games on worker processes')
+    parser.add_argument('--generations', type=int, default=None, help='generations to evolve headless, forever if not given')
+    parser.add_argument('--pop-size', type=int, default=20, help='number of individuals in population')
+    parser.add_argument('--layers', type=parse_layers, default=(INPUTS, 16, 16, OUTPUTS), help='sizes of network layers, such as 12,16,16,3')
+    parser.add_argument('--optimizer', choices=tuple(OPTIMIZERS), default='ga', help='genetic algorithm or evolution strategy')
+    parser.add_argument('--sigma', type=float, default=0.1, help='scale of perturbations of evolution strategy')
+    parser.add_argument('--learning-rate', type=float, default=0.03, help='step size of evolution strategy')
+    parser.add_argument('--mutate-prob', type=float, default=0.03, help='probability of mutating each gene of a child')
+    parser.add_argument('--retain-unfit-prob', type=float, default=0.01, help='probability of keeping an unfit individual as parent')
+    parser.add_argument('--select', type=float, default=0.333, help='fraction of fittest individuals kept as parents')
+    parser.add_argument('--rows', type=int, default=ROWS, help='rows of the board, independent of window size')
+    parser.add_argument('--columns', type=int, default=COLUMNS, help='columns of the board, independent of window size')
+    parser.add_argument('--no-loop-detection', action='store_true', help='let snakes repeating a state since they last ate play on')
+    parser.add_argument('--loop-penalty', type=float, default=100.0, help='score taken off a snake caught looping')
+    parser.add_argument('--max-steps-since-food', type=int, default=None, help='ticks a game goes on without food, board cells if not given')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes, defaults to number of cores')
+    parser.add_argument('--seed', type=int, default=None, help='seed making headless runs reproducible')
+    parser.add_argument('--cache-size', type=int, default=1024, help='results of games kept to skip replaying retained parents, 0 to disable')
+    parser.add_argument('--reevaluate', action='store_true', help='play retained parents again on fresh seeds every generation')
+    parser.add_argument('--episodes', type=int, default=1, help='most episodes each individual plays, fitness is their mean score')
+    parser.add_argument('--fast-inference', action='store_true', help='decide moves with float32 networks skipping the output sigmoid')
+    parser.add_argument('--keep', type=float, default=0.5, help='fraction of individuals playing on after each round of episodes')
+    parser.add_argument('--islands', type=int, default=1, help='populations evolved headless in separate processes, migrating between them')
+    parser.add_argument('--topology', choices=TOPOLOGIES, default='ring', help='islands migrants are sent to, the next on a ring or all others')
+    parser.add_argument('--migrants', type=int, default=2, help='fittest individuals each island sends on every migration')
+    parser.add_argument('--migrate-every', type=int, default=10, help='generations between migrations')
+    parser.add_argument('--output', default=None, help='checkpoint to write final population to once headless generations are done')
+    parser.add_argument('--checkpoint-dir', default=None, help='directory to write checkpoints of the population into')
+    parser.add_argument('--checkpoint-every', type=int, default=10, help='generations between checkpoints')
+    parser.add_argument('--resume', action='store_true', help='resume from latest checkpoint in checkpoint directory')
+    parser.add_argument('--tiled', action='store_true', help='play whole population at once, showing every game')
+    parser.add_argument('--record-dir', default=None, help='directory to record best episode of every headless generation into')
+    parser.add_argument('--stats', default=None, help='jsonl file to append timings of each phase and stats of every generation to')
+    args = parser.parse_args(args)
+    # snake starts as 5 cells heading up from the middle of the board, its head needs a row ahead of it
+    if args.rows < 10 or args.columns < 1:
+        parser.error('board needs at least 10 rows, so that the starting snake has room to move, and 1 column')
+    if args.tiled and args.rows * args.columns > SPARSE_AREA:
+        parser.error(f'tiled view plays games as a batch, which takes boards of at most {SPARSE_AREA} cells')
+    return args
+
+def create_population(args, evaluator=None):
+    """ returns population resumed from latest checkpoint if asked to, else a new one """
+    if args.resume:
+        path = checkpoint.find_latest(args.checkpoint_dir)
+        if path is not None:
+            print(f'resuming from {path}')
+            return checkpoint.load(path, evaluator=evaluator)
+    random.seed(args.seed)
+    return Population(**get_population_options(args))
+
+def get_population_options(args):
+    return dict(
+        pop_size=args.pop_size,
+        mutate_prob=args.mutate_prob,
+        retain_unfit_prob=args.retain_unfit_prob,
+        select=args.select,
+        layers=args.layers,
+        board=(args.rows, args.columns),
+        optimizer=create_optimizer(args),
+        rules=Rules(not args.no_loop_detection, args.loop_penalty, args.max_steps_since_food),
+    )
+
+def create_optimizer(args):
+    if args.optimizer == 'es':
+        return EvolutionStrategy(sigma=args.sigma, learning_rate=args.learning_rate)
+    return GeneticOptimizer()
+
+def get_evaluator_options(args):
+    return dict(
+        cache_size=args.cache_size,
+        reevaluate=args.reevaluate,
+        episodes=args.episodes,
+        keep=args.keep,
+        fast=args.fast_inference,
+    )
+
+def create_checkpointer(args, evaluator=None):
+    if args.checkpoint_dir is None:
+        return None
+    return Checkpointer(args.checkpoint_dir, every=args.checkpoint_every, evaluator=evaluator)
+
+def create_instruments(args):
+    return Instruments(args.stats, enabled=args.stats is not None)
+
+def train(args):
+    """ evolves the population headless for the given number of generations, forever if there is none """
+    evaluator = Evaluator(workers=args.workers, seed=args.seed, record=args.record_dir is not None, **get_evaluator_options(args))
+    population = create_population(args, evaluator)
+    checkpointer = create_checkpointer(args, evaluator)
+    recorder = Recorder(args.record_dir) if args.record_dir is not None else None
+    instruments = create_instruments(args)
+    evaluate = instruments.timed('evaluate', evaluator.evaluate)
+    evolve = instruments.timed('evolve', Population.evolve)
+    try:
+        generations = 0
+        while args.generations is None or generations < args.generations:
+            generations += 1
+            evaluate(population)
+            if recorder is not None:
+                recorder.save(evaluator.best_episode, population.generation)
+            instruments.record_generation(population)
+            evolve(population)
+            if checkpointer is not None:
+                checkpointer.update(population)
+        if args.output is not None:
+            checkpoint.save(population, args.output, evaluator)
+    finally:
+        evaluator.close()
+        instruments.close()
+        if checkpointer is not None:
+            checkpointer.wait()
+    return population
+
+def train_islands(args):
+    """ evolves populations on islands headless, migrating between them, for the given number of generations or forever """
+    archipelago = Archipelago(
+        islands=args.islands,
+        topology=args.topology,
+        migrants=args.migrants,
+        every=args.migrate_every,
+        seed=args.seed,
+        population_options=get_population_options(args),
+        evaluator_options=get_evaluator_options(args),
+    )
+    try:
+        generations = 0
+        while args.generations is None or generations < args.generations:
+            step = args.migrate_every
+            if args.generations is not None:
+                step = min(step, args.generations - generations)
+            best = archipelago.evolve(step)
+            generations += step
+            print(f'{archipelago.generation - 1}  --> ' + ' '.join(f'{fitness/1000:.3f}' for fitness in best))
+    finally:
+        archipelago.close()
+    return archipelago
 
 def main():
-    Game.get_instance().loop()
-    pygame.quit()
+    args = parse_args()
+    if args.resume and args.checkpoint_dir is None:
+        raise SystemExit('--resume needs --checkpoint-dir')
+    if args.islands > 1:
+        if not args.headless:
+            raise SystemExit('--islands needs --headless')
+        if args.optimizer != 'ga':
+            raise SystemExit('--islands migrates fittest parents, which only the genetic algorithm keeps')
+        if args.checkpoint_dir or args.record_dir or args.stats or args.output:
+            raise SystemExit('--islands does not write checkpoints, recordings or stats')
+        train_islands(args)
+    elif args.headless:
+        train(args)
+    else:
+        # only the window needs pygame, headless runs never import it
+        import pygame
+        from game import Game
+
+        checkpointer = create_checkpointer(args)
+        instruments = create_instruments(args)
+        Game.get_instance(create_population(args), checkpointer, args.tiled, instruments).loop()
+        instruments.close()
+        if checkpointer is not None:
+            checkpointer.wait()
+        pygame.quit()
 
 if __name__=='__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,351 @@
+from math import sqrt
+
+from numpy import (arange, argmax, array, bitwise_xor, concatenate, cumsum, flatnonzero, float64, full, int32, int64,
+                   isin, random, sqrt as vsqrt, uint8, uint64, union1d, where, zeros, zeros_like)
+
+from objects import COLUMNS, ROWS, SPARSE_AREA, Food
+from snake import Rules
+from utilities import Direction
+
+
+def direction_table(function):
+    """ tabulates a Direction helper for the four moving directions, indexed by direction value """
+    return array([function(Direction(value)).value for value in range(4)])
+
+def mix(x):
+    """ splitmix64 finalizer, scrambles uint64 values into pseudo random keys """
+    x = x + uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> uint64(30))) * uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> uint64(27))) * uint64(0x94D049BB133111EB)
+    return x ^ (x >> uint64(31))
+
+
+class SnakeBatch:
+    """
+    holds many independent snake games as numpy arrays and advances all
+    live games with one vectorized step, following the rules of Snake.update
+
+    cells are packed as y * columns + x, each game's body is a ring buffer of
+    packed cells running from tail_index to head_index
+    """
+    # (x, y) deltas indexed by Direction value
+    DELTAS = array([(-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1)])
+    LEFT = direction_table(Direction.get_direction_to_left)
+    OPPOSITE = direction_table(Direction.get_opposite_direction)
+    # directions relative to snake, in the order used by Snake's features
+    RELATIVE = array([[d.value for d in Direction.get_relative_directions(Direction(value))] for value in range(4)])
+    # keys mixed into a body's hash to tell states apart by direction
+    DIRECTION_KEYS = mix(arange(4, dtype=uint64) | uint64(1 << 63))
+
+    def __init__(self, size, seed=None, board=(ROWS, COLUMNS), rules=None):
+        self.size = size
+        self.random = random.RandomState(seed)
+        self.threshold_movement_score = -25
+        self.food_value = Food().value
+
+        # grid dimensions, every game keeps a dense grid and a body buffer as large as the board,
+        # so boards large enough for sparse grounds are played by Snake instead
+        self.rows, self.columns = board
+        if self.rows * self.columns > SPARSE_AREA:
+            raise ValueError(f'batches play boards of at most {SPARSE_AREA} cells, not {self.rows}x{self.columns}')
+        self.diagonal = sqrt(self.rows ** 2 + self.columns ** 2)
+        self.capacity = self.rows * self.columns + 2
+        # stalled games end as with Snake's rules
+        self.rules = rules or Rules()
+        self.max_steps_since_food = self.rules.max_steps_since_food or self.rows * self.columns
+
+        # ray lengths after k steps, accumulated the same way Snake's ray casts do
+        # first row for straight rays, second row for diagonal rays
+        steps = max(self.rows, self.columns)
+        self.ray_lengths = zeros((2, steps + 1))
+        self.ray_lengths[0, 1:] = cumsum(full(steps, 1.0))
+        self.ray_lengths[1, 1:] = cumsum(full(steps, sqrt(2)))
+        self.ray_steps = arange(1, steps + 1)
+
+        # game state, one row per game
+        self.grid = zeros((size, self.rows, self.columns), dtype=uint8)
+        self.cells = self.grid.reshape(size, -1)
+        self.body = zeros((size, self.capacity), dtype=int32)
+        self.head_index = zeros(size, dtype=int64)
+        self.tail_index = zeros(size, dtype=int64)
+        # free cells left on each game's grid, kept as cells are marked
+        self.free_count = full(size, self.rows * self.columns, dtype=int64)
+        self.head_x = zeros(size, dtype=int64)
+        self.head_y = zeros(size, dtype=int64)
+        self.direction = full(size, Direction.UP.value, dtype=int64)
+        self.food_x = zeros(size, dtype=int64)
+        self.food_y = zeros(size, dtype=int64)
+        self.score = zeros(size, dtype=float64)
+        self.movement_score = zeros(size, dtype=float64)
+        self.items_consumed = zeros(size, dtype=int64)
+        self.steps = zeros(size, dtype=int64)
+        self.steps_since_food = zeros(size, dtype=int64)
+        # hash of each game's body, xor of keys of its cells each linked to the cell in front of it,
+        # kept up to date as head moves and tail drops
+        self.body_hash = zeros(size, dtype=uint64)
+        # hashes of states of each game since its snake last ate, columns are added as needed
+        self.visited = zeros((size, 64), dtype=uint64)
+        self.visited_count = zeros(size, dtype=int64)
+        self.delta_distance = zeros(size, dtype=float64)
+        self.game_over = zeros(size, dtype=bool)
+        self.won = zeros(size, dtype=bool)
+        self.features = zeros((size, 12), dtype=float64)
+
+        # snake of length 5 at center of board heading up, same as Snake
+        games = arange(size)
+        x_, y_ = int(self.columns/2), int(self.rows/2)
+        length = 5
+        for i in range(length):
+            self.body[:, i] = (y_ - i) * self.columns + x_
+        self.cells[:, self.body[0, :length]] = 1
+        self.free_count -= length
+        self.head_index[:] = length - 1
+        self.head_x[:] = x_
+        self.head_y[:] = y_ - length + 1
+        cells = self.body[0, :length]
+        self.body_hash[:] = bitwise_xor.reduce(self.get_cell_keys(cells, concatenate((cells[1:], cells[-1:]))))
+
+        self.place_food(games)
+        self.delta_distance[:] = self.find_distance(games)
+
+    def live_games(self):
+        """ returns indices of games that are not over """
+        return flatnonzero(~self.game_over)
+
+    def update(self):
+        """
+        advances every live game by one tick and returns a mask of the games
+        that ended during this tick
+        """
+        ended = zeros(self.size, dtype=bool)
+        games = started = self.live_games()
+        if len(games) == 0:
+            return ended
+        self.steps[games] += 1
+        self.steps_since_food[games] += 1
+
+        # marking ground before moving, then dropping tail
+        tail = self.body[games, self.tail_index[games]]
+        self.cells[games, tail] = 0
+        self.free_count[games] += 1
+        self.tail_index[games] = (self.tail_index[games] + 1) % self.capacity
+        self.body_hash[games] ^= self.get_cell_keys(tail, self.body[games, self.tail_index[games]])
+
+        # moving head one cell in its direction
+        self.push_head(games)
+
+        # if food is consumed, head grows one more cell and food moves
+        eaten = games[(self.head_x[games] == self.food_x[games]) & (self.head_y[games] == self.food_y[games])]
+        if len(eaten):
+            self.items_consumed[eaten] += 1
+            self.score[eaten] += self.food_value
+            self.steps_since_food[eaten] = 0
+            self.visited_count[eaten] = 0
+            self.push_head(eaten)
+            self.place_food(eaten)
+
+        # game is over if board is full, head left the grid or snake is wandering away from food
+        over = ~self.is_inside_grid(self.head_x[games], self.head_y[games])
+        over |= self.movement_score[games] < self.threshold_movement_score
+        over |= self.won[games]
+        self.game_over[games[over]] = True
+        games = games[~over]
+
+        # ending games that loop or go on too long without food
+        stalled = self.find_stalled(games[~self.game_over[games]])
+        self.game_over[stalled] = True
+        if len(stalled):
+            games = games[~isin(games, stalled)]
+
+        # updating distance between food and snake and score related to it
+        current_delta_distance = self.find_distance(games)
+        closer = current_delta_distance < self.delta_distance[games]
+        self.movement_score[games] += where(closer, 1, -1.5)
+        self.delta_distance[games] = current_delta_distance
+
+        # features for snakes' neural networks
+        self.features[games] = self.get_features(games)
+
+        ended[started] = self.game_over[started]
+        return ended
+
+    def find_stalled(self, games):
+        """
+        returns those of given games whose snakes are repeating a state since they last ate,
+        taking off loop penalty, or went too long without food
+        """
+        stalled = games[self.steps_since_food[games] > self.max_steps_since_food]
+        if not self.rules.detect_loops:
+            return stalled
+        states = self.body_hash[games] ^ self.DIRECTION_KEYS[self.direction[games]]
+        count = self.visited_count[games]
+        width = count.max() if len(games) else 0
+        seen = ((self.visited[games, :width] == states[:, None]) & (arange(width) < count[:, None])).any(axis=1)
+
+        # remembering new states, widening the table when a game runs out of columns
+        fresh, index = games[~seen], count[~seen]
+        if len(fresh) and index.max() >= self.visited.shape[1]:
+            self.visited = concatenate((self.visited, zeros_like(self.visited)), axis=1)
+        self.visited[fresh, index] = states[~seen]
+        self.visited_count[fresh] += 1
+
+        looping = games[seen]
+        if len(looping):
+            self.score[looping] -= self.rules.loop_penalty
+            stalled = union1d(stalled, looping)
+        return stalled
+
+    def get_cell_keys(self, cells, fronts):
+        """ keys of body cells each linked to the cell in front of it, a head is linked to itself """
+        cells = cells.astype(int64)
+        links = fronts - cells + self.columns + 1
+        return mix((cells * (2 * self.columns + 2) + links).astype(uint64))
+
+    def push_head(self, games):
+        """ adds a new head one cell ahead in current direction and marks it on grid """
+        deltas = self.DELTAS[self.direction[games]]
+        x_ = self.head_x[games] + deltas[:, 0]
+        y_ = self.head_y[games] + deltas[:, 1]
+        self.head_x[games] = x_
+        self.head_y[games] = y_
+        head = self.body[games, self.head_index[games]]
+        self.head_index[games] = (self.head_index[games] + 1) % self.capacity
+        self.body[games, self.head_index[games]] = y_ * self.columns + x_
+
+        # old head is now linked to the new one
+        new_head = self.body[games, self.head_index[games]]
+        self.body_hash[games] ^= (self.get_cell_keys(head, head) ^ self.get_cell_keys(head, new_head)
+                                  ^ self.get_cell_keys(new_head, new_head))
+
+        # cells outside grid are never marked, occupying a marked cell is game over
+        inside = self.is_inside_grid(x_, y_)
+        games, cells = games[inside], (y_ * self.columns + x_)[inside]
+        occupied = self.cells[games, cells] == 1
+        self.game_over[games[occupied]] = True
+        self.free_count[games[~occupied]] -= 1
+        self.cells[games, cells] = 1
+
+    def place_food(self, games, attempts=4):
+        """
+        finds new free position for food of given games, games without a free cell are won
+        a few rounds of random draws place most food, what's left is drawn from the free cells
+        """
+        free_cells = self.free_count[games]
+        full = games[free_cells == 0]
+        self.won[full] = True
+        self.game_over[full] = True
+        self.delta_distance[full] = 0
+
+        pending = games[free_cells > 0]
+        for attempt in range(attempts):
+            if len(pending) == 0:
+                return
+            x_ = self.random.randint(0, high=self.columns, size=len(pending))
+            y_ = self.random.randint(0, high=self.rows, size=len(pending))
+            free = self.grid[pending, y_, x_] == 0
+            self.food_x[pending[free]] = x_[free]
+            self.food_y[pending[free]] = y_[free]
+            pending = pending[~free]
+
+        for game in pending:
+            free = flatnonzero(self.cells[game] == 0)
+            y_, x_ = divmod(free[self.random.randint(0, high=len(free))], self.columns)
+            self.food_x[game], self.food_y[game] = x_, y_
+
+    def is_inside_grid(self, x_, y_):
+        """ checks which points lie inside the grid """
+        return (x_ >= 0) & (y_ >= 0) & (x_ < self.columns) & (y_ < self.rows)
+
+    def find_distance(self, games):
+        """ euclidean distance between head and food of given games """
+        dx = self.food_x[games] - self.head_x[games]
+        dy = self.food_y[games] - self.head_y[games]
+        return vsqrt((dx * dx + dy * dy).astype(float64))
+
+    def get_features(self, games):
+        """ returns feature matrix of given games, one row per game as in Snake.features """
+        return concatenate((
+            self.get_wall_distances(games),
+            self.get_body_distances(games),
+            self.get_food_distances(games),
+        ), axis=1)
+
+    def get_wall_distances(self, games):
+        x_, y_ = self.head_x[games, None], self.head_y[games, None]
+        deltas = self.DELTAS[self.RELATIVE[self.direction[games], :3]]
+        dx, dy = deltas[..., 0], deltas[..., 1]
+
+        # steps that can be taken along each axis before leaving the grid
+        big = max(self.rows, self.columns)
+        steps_x = where(dx < 0, x_, where(dx > 0, self.columns - 1 - x_, big))
+        steps_y = where(dy < 0, y_, where(dy > 0, self.rows - 1 - y_, big))
+        steps = steps_x.clip(max=steps_y)
+
+        distances = self.ray_lengths[abs(dx * dy), steps]
+        return distances / self.diagonal
+
+    def get_body_distances(self, games):
+        deltas = self.DELTAS[self.RELATIVE[self.direction[games]]]
+        dx, dy = deltas[..., 0, None], deltas[..., 1, None]
+
+        # every cell along each ray, shape (games, directions, steps)
+        x_ = self.head_x[games, None, None] + dx * self.ray_steps
+        y_ = self.head_y[games, None, None] + dy * self.ray_steps
+        inside = self.is_inside_grid(x_, y_)
+        cells = where(inside, y_ * self.columns + x_, 0)
+        hits = inside & (self.cells[games[:, None, None], cells] == 1)
+
+        # distance covered before first hit, rays that leave the grid don't hit body
+        first = argmax(hits, axis=2)
+        distances = self.ray_lengths[abs(dx * dy)[..., 0], first]
+        distances = where(hits.any(axis=2), distances, -self.diagonal)
+        return distances / self.diagonal
+
+    def get_food_distances(self, games):
+        direction = self.direction[games]
+        dx = self.food_x[games] - self.head_x[games]
+        dy = self.food_y[games] - self.head_y[games]
+
+        vertical = (direction == Direction.UP.value) | (direction == Direction.DOWN.value)
+        delta_v = where(vertical, dy, dx)
+        delta_h = where(vertical, dx, dy)
+
+        flip = (direction == Direction.DOWN.value) | (direction == Direction.RIGHT.value)
+        delta_v = where(flip, -delta_v, delta_v)
+        delta_h = where(flip, -delta_h, delta_h)
+
+        distances = array((delta_v, delta_h)).T
+        return distances / self.diagonal
+
+    def respond(self, y, games=None):
+        """
+        turns given games according to their network outputs y, one row per game,
+        columns are scores for left, straight and right as in Snake.respond
+        """
+        if games is None:
+            games = self.live_games()
+        index = argmax(y, axis=1)
+        turn = (y[arange(len(games)), index] > 0.5) & (index != 1)
+        games, index = games[turn], index[turn]
+
+        left_direction = self.LEFT[self.direction[games]]
+        right_direction = self.OPPOSITE[left_direction]
+        self.direction[games] = where(index == 0, left_direction, right_direction)
+
+    def play(self, policy, callback=None):
+        """
+        plays every game until it is over, policy is called with the features
+        of live games and their indices and returns their network outputs,
+        callback, if given, is called with the batch after every tick
+        """
+        while not self.game_over.all():
+            ended = self.update()
+            # distance from food is taken off the score when game ends, as in Game.loop
+            self.score[ended] -= self.delta_distance[ended]
+
+            games = self.live_games()
+            if len(games):
+                self.respond(policy(self.features[games], games), games)
+            if callback is not None:
+                callback(self)
+        return self.score
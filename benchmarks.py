@@ -0,0 +1,261 @@
+import argparse
+import json
+import platform
+import sys
+from time import perf_counter
+
+import numpy
+from numpy import random, stack
+
+from evaluation import Evaluator
+from genetic import Population
+from neural import FastNetwork, NeuralNetwork
+from objects import create_ground
+from snake import Rules, Snake
+from utilities import DELTAS, Direction
+
+# timings depend on the machine, so baselines aren't shipped: record one on a machine with
+#   python benchmarks.py --output baseline.json
+# and check later runs on the same machine against it with --baseline baseline.json
+LAYERS = (12, 16, 16, 3)
+# snakes circling in benchmarks would be caught looping after a lap
+CIRCLING = Rules(detect_loops=False)
+
+
+def measure(function, number=1, repeat=5):
+    """ returns best time per call of function, over repeat rounds of number calls """
+    best = None
+    for i in range(repeat):
+        start = perf_counter()
+        for j in range(number):
+            function()
+        elapsed = (perf_counter() - start) / number
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def play_ticks(snake, nn, ticks):
+    """ plays ticks of snake's game with network, starting new games as they end, returns snake """
+    for i in range(ticks):
+        snake.update()
+        if snake.game_over:
+            snake.reset(i)
+            continue
+        snake.respond(nn.feed_forward(snake.get_features()).ravel())
+    return snake
+
+def steer(snake, step):
+    """ winds snake up and down the board from left to right, step being cells it moves on next tick """
+    x_, y_ = snake.head
+    rows = snake.ground.rows
+    if snake.direction == Direction.RIGHT:
+        snake.move(Direction.DOWN if y_ < rows // 2 else Direction.UP)
+    elif snake.direction == Direction.UP and y_ - step < 2:
+        snake.move(Direction.RIGHT)
+    elif snake.direction == Direction.DOWN and y_ + step > rows - 3:
+        snake.move(Direction.RIGHT)
+
+def grow(snake, length, ticks=20):
+    """
+    feeds snake food right ahead of it on every tick until it is length long, then plays
+    ticks without food so that it has states visited since it last ate, returns snake
+    """
+    # food placed after each meal lies anywhere, so wandering away from it is forgiven
+    while len(snake.body) < length:
+        # eating moves head two cells
+        steer(snake, 2)
+        deltax, deltay = DELTAS[snake.direction]
+        snake.food.x_, snake.food.y_ = snake.head[0] + deltax, snake.head[1] + deltay
+        snake.movement_score = 0
+        snake.update()
+    for i in range(ticks):
+        steer(snake, 1)
+        snake.movement_score = 0
+        snake.update()
+    return snake
+
+def score(population):
+    """ gives individuals of population random scores, as if their games were played """
+    for individual in population.individuals:
+        individual.finish(random.rand(), 0)
+    return population
+
+
+def bench_snake_update(results, quick):
+    """ time per Snake.update and its features, snake circling so that new games are rarely needed """
+    ticks = 200 if quick else 2000
+    def run():
+        snake = Snake(0, rules=CIRCLING)
+        for i in range(ticks):
+            snake.update()
+            if snake.game_over:
+                snake.reset(i)
+                continue
+            snake.get_features()
+            if i % 4 == 0:
+                snake.turn(2)
+    results['snake.update'] = measure(run, repeat=3 if quick else 5) / ticks
+
+def bench_board_sizes(results, quick):
+    """ time per Snake.update and its features against board size, on dense and sparse grounds, including new games """
+    ticks = 200 if quick else 2000
+    sizes = (16, 64, 256) if quick else (16, 64, 256, 1024, 4096)
+    for size in sizes:
+        for sparse in (False, True):
+            # dense grounds of the largest boards take too much memory
+            if not sparse and size > 1024:
+                continue
+            # reset clears the last repeat's snake off the ground before starting over
+            snake = Snake(0, create_ground(size, size, sparse), CIRCLING)
+            def run():
+                snake.reset(0)
+                for i in range(ticks):
+                    snake.update()
+                    if snake.game_over:
+                        snake.reset(i)
+                        continue
+                    snake.get_features()
+                    if i % 4 == 0:
+                        snake.turn(2)
+            kind = 'sparse' if sparse else 'dense'
+            results[f'board.{kind}.{size}'] = measure(run, repeat=3) / ticks
+
+def bench_get_features(results, quick):
+    """ time of each part of snake's features, in the middle of a game """
+    random.seed(0)
+    snake = play_ticks(Snake(0), NeuralNetwork(layers=LAYERS), 20)
+    number = 200 if quick else 2000
+    results['features.wall'] = measure(snake.get_wall_distances, number)
+    results['features.body'] = measure(snake.get_body_distances, number)
+    results['features.food'] = measure(snake.get_food_distances, number)
+
+def bench_snapshot(results, quick):
+    """ time of Snake.snapshot and restore against snake's length, with states visited since it last ate """
+    number = 200 if quick else 2000
+    lengths = (10, 100) if quick else (10, 100, 1000)
+    for length in lengths:
+        snake = grow(Snake(0, create_ground(128, 128)), length)
+        results[f'snake.snapshot.{length}'] = measure(lambda: snake.release(snake.snapshot()), number)
+        state = snake.snapshot()
+        results[f'snake.restore.{length}'] = measure(lambda: snake.restore(state), number)
+        snake.release(state)
+
+def bench_feed_forward(results, quick):
+    """ time per NeuralNetwork.feed_forward and FastNetwork.decide for a few network shapes """
+    number = 200 if quick else 2000
+    for layers in ((12, 16, 16, 3), (12, 64, 64, 3), (12, 256, 3)):
+        nn = NeuralNetwork(layers=layers)
+        fast = FastNetwork(nn.weights)
+        X = random.rand(layers[0], 1)
+        shape = 'x'.join(map(str, layers))
+        results['feed_forward.' + shape] = measure(lambda: nn.feed_forward(X), number)
+        results['decide.' + shape] = measure(lambda: fast.decide(X), number)
+
+def bench_evolution(results, quick):
+    """ time of crossover, breeding genomes and evolve against population size """
+    sizes = (20, 200) if quick else (20, 200, 2000)
+    population = Population(pop_size=2, layers=LAYERS)
+    weights1, weights2 = [i.nn.weights for i in population.individuals]
+    results['population.crossover'] = measure(lambda: population.crossover(weights1, weights2), 100)
+    for pop_size in sizes:
+        population = score(Population(pop_size=pop_size, layers=LAYERS))
+        population.grade()
+        population.select_parents()
+        # breeding overwrites the parents' rows, so children are bred from a fixed copy of them
+        parents = stack([parent.genome for parent in population.parents])
+        children_size = pop_size - len(parents)
+        results[f'population.breed_genomes.{pop_size}'] = measure(
+            lambda: population.breed_genomes(parents, children_size), repeat=3)
+        results[f'population.evolve.{pop_size}'] = measure(lambda: score(population).evolve(), repeat=3)
+
+def bench_generations(results, quick):
+    """ time of a full generation against population and board size, played one by one and as a batch """
+    sizes = (20,) if quick else (20, 100)
+    boards = ((16, 16), (48, 64)) if quick else ((16, 16), (48, 64), (128, 128))
+    for pop_size in sizes:
+        for board in boards:
+            name = f'{pop_size}.{board[0]}x{board[1]}'
+            random.seed(0)
+            population = Population(pop_size=pop_size, layers=LAYERS, board=board)
+            evaluator = Evaluator(workers=1, seed=0)
+            def generation():
+                evaluator.evaluate(population)
+                population.evolve()
+            results[f'generation.serial.{name}'] = measure(generation, repeat=3)
+
+            random.seed(0)
+            population = Population(pop_size=pop_size, layers=LAYERS, board=board)
+            def batch_generation():
+                population.evaluate_batch(seed=0)
+                population.evolve()
+            results[f'generation.batch.{name}'] = measure(batch_generation, repeat=3)
+
+BENCHMARKS = (
+    bench_snake_update,
+    bench_board_sizes,
+    bench_get_features,
+    bench_snapshot,
+    bench_feed_forward,
+    bench_evolution,
+    bench_generations,
+)
+
+
+def run(names=None, quick=False):
+    """ runs benchmarks whose name contains one of names, all if names is empty, returns seconds per call """
+    results = {}
+    for bench in BENCHMARKS:
+        if not names or any(name in bench.__name__ for name in names):
+            bench(results, quick)
+    return results
+
+def compare(results, baseline, threshold):
+    """
+    returns benchmarks slower than baseline by more than their threshold, as (name, baseline, result, ratio),
+    baseline may set a threshold per benchmark in its 'thresholds'
+    """
+    thresholds = baseline.get('thresholds', {})
+    regressions = []
+    for name, seconds in results.items():
+        if name not in baseline['results']:
+            continue
+        ratio = seconds / baseline['results'][name]
+        if ratio > 1 + thresholds.get(name, threshold):
+            regressions.append((name, baseline['results'][name], seconds, ratio))
+    return regressions
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmarks of simulation, inference and evolution, without a display')
+    parser.add_argument('names', nargs='*', help='only run benchmarks whose name contains one of these')
+    parser.add_argument('--quick', action='store_true', help='fewer and smaller runs')
+    parser.add_argument('--output', default=None, help='write results as json to this path')
+    parser.add_argument('--baseline', default=None, help='compare against results written by --output on this machine')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed slowdown against baseline, 0.2 for 20%%')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    results = run(args.names, args.quick)
+    for name, seconds in results.items():
+        print(f'{name:32} {seconds * 1e6:12.2f} us {1 / seconds:14.0f} /s')
+
+    if args.output is not None:
+        report = {
+            'python': platform.python_version(),
+            'numpy': numpy.__version__,
+            'machine': platform.machine(),
+            'results': results,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for name, before, after, ratio in regressions:
+            print(f'regression {name}: {before * 1e6:.2f} us -> {after * 1e6:.2f} us ({ratio:.2f}x)')
+        if regressions:
+            sys.exit(1)
+
+if __name__=='__main__':
+    main()
@@ -0,0 +1,126 @@
+import os
+from glob import glob
+from threading import Thread
+
+from numpy import array, int64, load as load_arrays, random, savez
+
+from genetic import Population
+from optimizers import OPTIMIZERS
+from snake import Rules
+
+
+def capture(population, evaluator=None):
+    """ copies everything needed to resume evolution into a dict of arrays """
+    name, keys, position, has_gauss, cached_gaussian = random.get_state()
+    arrays = {
+        'genomes': population.genomes.copy(),
+        'layers': array(population.layers),
+        'board': array(population.board),
+        # rules as whether loops are detected, loop penalty and steps without food allowed, -1 for default
+        'rules': array((population.rules.detect_loops, population.rules.loop_penalty, population.rules.max_steps_since_food or -1), dtype=float),
+        'hyperparameters': array((population.mutate_prob, population.retain_unfit_prob, population.select)),
+        'generation': array(population.generation),
+        'fitness_history': array(population.fitness_history, dtype=float),
+        # seeds of games retained parents are played on, -1 for none
+        'seeds': array([-1 if i.seed is None else i.seed for i in population.individuals], dtype=int64),
+        # state of numpy's global random stream used for selection and breeding
+        'random_keys': keys,
+        'random_position': array((position, has_gauss)),
+        'random_gaussian': array(cached_gaussian),
+    }
+    # optimizer and whatever it needs to carry on, such as the center of an evolution strategy
+    arrays['optimizer'] = array(population.optimizer.name)
+    for key, value in population.optimizer.get_state().items():
+        arrays['optimizer_' + key] = value
+    if evaluator is not None:
+        # seeds for games continue from where the evaluator was
+        arrays['seed_entropy'] = array(str(evaluator.seeds.entropy))
+        arrays['seeds_spawned'] = array(evaluator.seeds.n_children_spawned)
+    return arrays
+
+def get_rules(values):
+    """ returns rules from the array they were captured as """
+    detect_loops, loop_penalty, max_steps_since_food = values.tolist()
+    return Rules(bool(detect_loops), loop_penalty, int(max_steps_since_food) if max_steps_since_food >= 0 else None)
+
+def write(arrays, path):
+    """ writes arrays to path, replacing any older file only once writing is complete """
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as f:
+        savez(f, **arrays)
+    os.replace(temporary, path)
+
+def save(population, path, evaluator=None):
+    """ writes a checkpoint of population to path """
+    write(capture(population, evaluator), path)
+
+def load(path, shared=False, evaluator=None):
+    """ returns population restored from checkpoint at path, restoring random streams as well """
+    with load_arrays(path) as arrays:
+        mutate_prob, retain_unfit_prob, select = arrays['hyperparameters']
+        optimizer = OPTIMIZERS[str(arrays['optimizer'])]()
+        optimizer.set_state({key[len('optimizer_'):]: arrays[key] for key in arrays.files if key.startswith('optimizer_')})
+        population = Population(
+            pop_size=len(arrays['genomes']),
+            mutate_prob=float(mutate_prob),
+            retain_unfit_prob=float(retain_unfit_prob),
+            select=float(select),
+            layers=tuple(int(l) for l in arrays['layers']),
+            shared=shared,
+            genomes=arrays['genomes'],
+            board=tuple(int(size) for size in arrays['board']),
+            optimizer=optimizer,
+            rules=get_rules(arrays['rules']),
+        )
+        population.generation = int(arrays['generation'])
+        population.fitness_history = arrays['fitness_history'].tolist()
+        for individual, seed in zip(population.individuals, arrays['seeds'].tolist()):
+            individual.seed = None if seed < 0 else seed
+
+        position, has_gauss = arrays['random_position']
+        random.set_state(('MT19937', arrays['random_keys'], int(position), int(has_gauss), float(arrays['random_gaussian'])))
+        if evaluator is not None and 'seed_entropy' in arrays:
+            evaluator.seeds = random.SeedSequence(
+                int(arrays['seed_entropy']),
+                n_children_spawned=int(arrays['seeds_spawned']),
+            )
+    return population
+
+def find_latest(directory):
+    """ returns path of latest checkpoint in directory, None if there is none """
+    paths = sorted(glob(os.path.join(directory, 'generation-*.npz')))
+    return paths[-1] if paths else None
+
+
+class Checkpointer:
+    """
+    writes a checkpoint every few generations into a directory
+
+    the population is copied on the training thread, which is cheap next to
+    playing a generation, and written to disk on a background thread
+    """
+    def __init__(self, directory, every=10, evaluator=None):
+        self.directory = directory
+        self.every = every
+        self.evaluator = evaluator
+        self.writer = None
+        os.makedirs(directory, exist_ok=True)
+
+    def update(self, population):
+        """ checkpoints population if its generation is due """
+        if population.generation % self.every == 0:
+            self.save(population)
+
+    def save(self, population):
+        """ checkpoints population in the background, waiting for previous checkpoint to finish first """
+        arrays = capture(population, self.evaluator)
+        path = os.path.join(self.directory, f'generation-{population.generation:08d}.npz')
+        self.wait()
+        self.writer = Thread(target=write, args=(arrays, path), daemon=True)
+        self.writer.start()
+
+    def wait(self):
+        """ waits for checkpoint being written, if any """
+        if self.writer is not None:
+            self.writer.join()
+            self.writer = None
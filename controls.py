@@ -0,0 +1,69 @@
+from collections import deque
+from enum import Enum
+from time import perf_counter
+
+import pygame
+
+from utilities import Direction
+
+
+class Command(Enum):
+    EXIT = 0
+    PAUSE = 1           # toggles pause
+    SPEED = 2           # sets frame rate
+    SKIP = 3            # ends current snake's game
+    SCREEN = 4          # turns drawing on or off
+    MOVE = 5            # moves snake by hand
+
+
+class Controls:
+    """
+    turns window and keyboard events into commands queued for the game to apply
+
+    events are polled at a fixed wall clock rate rather than on every tick, so
+    simulating many ticks a second doesn't pay for handling input on each of them.
+    events have to be taken on the thread that opened the window, so polling
+    stays on the simulation's thread but costs a clock read when not due
+    """
+    KEYS = {
+        pygame.K_UP: (Command.MOVE, Direction.UP),
+        pygame.K_DOWN: (Command.MOVE, Direction.DOWN),
+        pygame.K_LEFT: (Command.MOVE, Direction.LEFT),
+        pygame.K_RIGHT: (Command.MOVE, Direction.RIGHT),
+        # keys to control frame rate
+        pygame.K_u: (Command.SPEED, 10000),
+        pygame.K_i: (Command.SPEED, 100),
+        pygame.K_o: (Command.SPEED, 10),
+        pygame.K_p: (Command.SPEED, 1),
+        # q: current snake's game is over
+        pygame.K_q: (Command.SKIP, None),
+        # s: draws screen, a: stops drawing on screen
+        pygame.K_s: (Command.SCREEN, True),
+        pygame.K_a: (Command.SCREEN, False),
+        # k: toggles pause
+        pygame.K_k: (Command.PAUSE, None),
+    }
+
+    def __init__(self, rate=30):
+        self.interval = 1 / rate     # seconds between polls
+        self.last_poll = 0
+        self.commands = deque()
+
+    def poll(self):
+        """ queues commands for events since last poll if a poll is due, returns whether any are queued """
+        now = perf_counter()
+        if now - self.last_poll >= self.interval:
+            self.last_poll = now
+            self.handle(pygame.event.get())
+        return len(self.commands) > 0
+
+    def wait(self):
+        """ blocks until the next event and queues its command, if any """
+        self.handle([pygame.event.wait()])
+
+    def handle(self, events):
+        for event in events:
+            if event.type == pygame.QUIT:
+                self.commands.append((Command.EXIT, None))
+            elif event.type == pygame.KEYDOWN and event.key in self.KEYS:
+                self.commands.append(self.KEYS[event.key])
@@ -0,0 +1,202 @@
+from collections import OrderedDict
+from hashlib import blake2b
+from math import ceil
+from multiprocessing import Pool, cpu_count, shared_memory
+
+from numpy import argsort, float32, inf, minimum, ndarray, nextafter, random, unique, zeros
+
+from genetic import Individual
+from recording import Episode
+
+# genome matrices in shared memory that this process has attached to, by name
+attached = {}
+
+
+def attach(name, shape):
+    """ returns genome matrix held in named shared memory, attaching to it on first use """
+    if name not in attached:
+        memory = shared_memory.SharedMemory(name=name)
+        attached[name] = (memory, ndarray(shape, dtype=float32, buffer=memory.buf))
+    return attached[name][1]
+
+def play(task):
+    """
+    plays one game in a worker process, with fast inference if asked to, returns its score,
+    number of items consumed, number of ticks and the moves made if recording,
+    genome is either a copy of the individual's genome or where to find it in shared memory
+    """
+    layers, board, rules, genome, seed, record, fast = task
+    if isinstance(genome, tuple):
+        name, shape, index = genome
+        genome = attach(name, shape)[index]
+    individual = Individual(layers=layers, genome=genome, seed=seed, board=board, rules=rules)
+    actions = bytearray() if record else None
+    individual.play(actions, fast)
+    snake = individual.snake
+    return snake.score, snake.items_consumed, snake.steps, actions
+
+def get_episode_seed(seed, episode):
+    """ returns seed of an individual's episode, its own seed for the first one """
+    if episode == 0:
+        return seed
+    return int(random.SeedSequence((seed, episode)).generate_state(1)[0])
+
+
+class FitnessCache:
+    """
+    results of games already played, keyed by genome and seed, evicting the least recently used
+    result once more than size are kept. games are deterministic given both, so a genome
+    played again on the same seed needs no simulation
+    """
+    def __init__(self, size=1024):
+        self.size = size
+        self.results = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, genome, seed):
+        return blake2b(genome.tobytes(), digest_size=16).digest(), seed
+
+    def get(self, key):
+        """ returns result stored under key, None if there is none """
+        result = self.results.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.results.move_to_end(key)
+        return result
+
+    def put(self, key, result):
+        self.results[key] = result
+        self.results.move_to_end(key)
+        if len(self.results) > self.size:
+            self.results.popitem(last=False)
+
+
+class Evaluator:
+    """
+    plays the games of a generation's individuals on a pool of worker processes
+
+    every game gets its own seed for food placement, drawn from one seed sequence
+    in the order of individuals, so scores don't depend on the number of workers.
+    individuals that already have a seed, parents retained from the last generation,
+    keep it unless re-evaluating, and their results are then taken from the cache.
+    when recording, the best episode of the last evaluated generation is kept
+
+    with several episodes, fitness is the mean score of the episodes an individual played.
+    episodes are played in rounds, and after each round only the best keep fraction
+    of individuals still racing play on, never fewer than the parents to be selected,
+    so individuals trailing the others stop being played early. an individual dropped
+    from the race ranks below every individual that played more episodes, even if a
+    mean over its fewer episodes is higher
+    """
+    def __init__(self, workers=None, seed=None, record=False, cache_size=1024, reevaluate=False, episodes=1, keep=0.5, fast=False):
+        self.workers = workers or cpu_count()
+        self.seeds = random.SeedSequence(seed)
+        self.pool = Pool(self.workers) if self.workers > 1 else None
+        self.record = record
+        self.best_episode = None
+        self.cache = FitnessCache(cache_size) if cache_size > 0 else None
+        self.reevaluate = reevaluate     # plays retained parents again on fresh seeds
+        self.episodes = episodes         # most episodes played by an individual
+        self.keep = keep                 # fraction of individuals racing on after each round
+        self.fast = fast                 # decides moves with float32 FastNetworks
+
+    def get_seeds(self, count):
+        """ returns seeds for the next count games """
+        return [int(s.generate_state(1)[0]) for s in self.seeds.spawn(count)]
+
+    def assign_seeds(self, individuals):
+        """ gives a fresh seed to every individual without one, or to all of them when re-evaluating """
+        fresh = [i for i in individuals if self.reevaluate or i.seed is None]
+        for individual, seed in zip(fresh, self.get_seeds(len(fresh))):
+            individual.seed = seed
+
+    def play_episodes(self, population, indices, episode):
+        """ returns results of given episode of individuals at indices, playing only those not cached """
+        individuals = population.individuals
+        seeds = [get_episode_seed(individuals[index].seed, episode) for index in indices]
+
+        # results of cached games, None for games to be played
+        results = [None] * len(indices)
+        if self.cache is not None:
+            keys = [self.cache.key(individuals[index].genome, seed) for index, seed in zip(indices, seeds)]
+            results = [self.cache.get(key) for key in keys]
+        pending = [i for i, result in enumerate(results) if result is None]
+
+        if population.memory is None:
+            genomes = population.genomes
+        else:
+            name, shape = population.memory.name, population.genomes.shape
+            genomes = [(name, shape, index) for index in range(len(individuals))]
+        tasks = [
+            (population.layers, population.board, population.rules, genomes[indices[i]], seeds[i], self.record, self.fast)
+            for i in pending
+        ]
+
+        if self.pool is None:
+            played = map(play, tasks)
+        else:
+            chunksize = ceil(len(tasks) / (4 * self.workers)) or 1
+            played = self.pool.map(play, tasks, chunksize=chunksize)
+        for i, result in zip(pending, played):
+            results[i] = result
+            if self.cache is not None:
+                self.cache.put(keys[i], result)
+        return seeds, results
+
+    def race(self, racing, fitness, parents_size):
+        """ returns indices of individuals racing on, the fittest of those racing """
+        size = max(ceil(len(racing) * self.keep), parents_size)
+        order = argsort(-fitness[racing], kind='stable')
+        return [racing[i] for i in sorted(order[:size])]
+
+    def evaluate(self, population):
+        """ plays games of all individuals of population and records their scores """
+        individuals = population.individuals
+        self.assign_seeds(individuals)
+        parents_size = int(population.select * population.pop_size)
+
+        scores = zeros(len(individuals))
+        items_consumed = zeros(len(individuals), dtype=int)
+        steps = zeros(len(individuals), dtype=int)
+        episodes = zeros(len(individuals), dtype=int)
+        racing = list(range(len(individuals)))
+        best_score = None
+        for episode in range(self.episodes):
+            if episode > 0:
+                # once no more than the parents are racing, further episodes can't change who is selected
+                if len(racing) <= parents_size:
+                    break
+                racing = self.race(racing, scores / episodes, parents_size)
+            seeds, results = self.play_episodes(population, racing, episode)
+            for index, seed, (score, items, ticks, actions) in zip(racing, seeds, results):
+                scores[index] += score
+                items_consumed[index] += items
+                steps[index] += ticks
+                episodes[index] += 1
+                if self.record and (best_score is None or score > best_score):
+                    best_score = score
+                    self.best_episode = Episode(seed, bytes(actions), population.board, population.rules)
+
+        fitness = self.rank(scores / episodes, episodes)
+        for individual, score, items, ticks, count in zip(individuals, fitness, items_consumed, steps, episodes):
+            individual.finish(float(score), int(items), int(ticks), int(count))
+
+    def rank(self, fitness, episodes):
+        """ returns fitness lowered so that individuals dropped from the race fall below those racing on after them """
+        fitness = fitness.copy()
+        floor = inf
+        for count in unique(episodes)[::-1]:
+            played = episodes == count
+            fitness[played] = minimum(fitness[played], floor)
+            floor = nextafter(fitness[played].min(), -inf)
+        return fitness
+
+    def close(self):
+        """ stops worker processes """
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
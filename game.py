@@ -1,59 +1,85 @@
 import pygame
 from numpy import array, random, reshape, ravel
 
+from controls import Command, Controls
 from genetic import Population
-from objects import Ground
-from utilities import Direction, Color
+from instruments import Instruments
+from neural import NeuralNetwork
+from renderer import Renderer, TiledView, fit_box_width
+from utilities import Color
 from snake import Snake
 
 class Game:
     __instance__ = None
 
-    def get_instance():
+    def get_instance(population=None, checkpointer=None, tiled=False, instruments=None):
         if Game.__instance__ == None:
-            Game()
+            Game(population, checkpointer, tiled, instruments)
         return Game.__instance__
 
-    def __init__(self):
-        self.frame_rate = 10000       # FPS
+    def __init__(self, population=None, checkpointer=None, tiled=False, instruments=None):
+        self.frame_rate = 10000       # ticks per second
         self.frames = 0              # counts number of frames elapsed
         self.exit = False            # Flag to exit the game
         self.pause = False
         self.manual = False
         self.screen_on = True
+        self.tiled = tiled           # plays whole population at once, showing every game
         title = 'Snake'         # Window Title
         icon_filename = 'res/icon.png'
 
         # loads pygame modules
         pygame.init()
 
-        # initializing game objects
-        self.population = Population(layers=(12, 16, 16, 3))
+        # initializing game objects, unless resuming a population
+        self.population = population or Population(layers=(12, 16, 16, 3))
+        # writes checkpoints of population during evolution, if given
+        self.checkpointer = checkpointer
+        # times phases of the loop and records every generation, if enabled
+        self.instruments = instruments or Instruments(enabled=False)
 
         # screen params
         icon = pygame.image.load(icon_filename)
         pygame.display.set_icon(icon)
         pygame.display.set_caption(title)
-        self.screen = pygame.display.set_mode(Ground().get_dimensions())
+        # cells are drawn as large as the board allows within the window
+        rows, columns = self.population.board
+        box_width = fit_box_width(rows, columns)
+        self.screen = pygame.display.set_mode((columns * box_width, rows * box_width))
     
         # reference clock
         self.clock = pygame.time.Clock()
+        # draws changed cells, working them out on its own thread
+        self.renderer = Renderer(self.screen, threaded=True, box_width=box_width)
+        self.set_frame_rate(self.frame_rate)
+        # input polled 30 times a second, as commands
+        self.controls = Controls(rate=30)
 
         Game.__instance__ = self
     
     def loop(self):
+        if self.tiled:
+            self.loop_tiled()
+            return
+        # phases of the loop, timed when instruments are enabled
+        timed = self.instruments.timed
+        capture_input = timed('capture_input', self.capture_input)
+        update_objects = timed('update', self.update_objects)
+        get_features = timed('get_features', Snake.get_features)
+        feed_forward = timed('feed_forward', NeuralNetwork.feed_forward)
+        respond = timed('respond', Snake.respond)
+        draw_objects = timed('draw', self.draw_objects)
+        evolve = timed('evolve', Population.evolve)
+
         while not self.exit:
             for individual in self.population.individuals:
                 snake = individual.snake
                 while not self.exit and not snake.game_over:
-                    # capture user input
-                    self.capture_input(snake)
-
-                    if self.pause:
-                        continue
+                    # capture user input, waiting here while paused
+                    capture_input(snake)
 
                     # update objects for each frame
-                    self.update_objects(snake)
+                    update_objects(snake)
 
                     # if game over skip
                     if snake.game_over:
@@ -62,70 +88,98 @@ class Game:
                         break
 
                     # get feature vector
-                    X = snake.get_features()
+                    X = get_features(snake)
                     
                     # output of feed forward of neural network
-                    y = ravel(individual.nn.feed_forward(X))
-                    snake.respond(y)
+                    y = ravel(feed_forward(individual.nn, X))
+                    respond(snake, y)
 
                     
                     if self.screen_on:
                         # draw objects on screen
-                        self.draw_objects(snake)
+                        draw_objects(snake)
                 # print(individual.nn.weights)
-            self.population.evolve()
+            # a generation cut short by exiting isn't recorded, evolved or checkpointed
+            if self.exit:
+                break
+            self.instruments.record_generation(self.population)
+            evolve(self.population)
+            if self.checkpointer is not None:
+                self.checkpointer.update(self.population)
+        self.renderer.close()
+
+    def loop_tiled(self):
+        """ plays games of all individuals at once, drawing every game as a tile of the screen """
+        rows, columns = self.population.board
+        self.tiled_view = TiledView(self.screen, self.population.pop_size, rows, columns)
+        timed = self.instruments.timed
+        evaluate_batch = timed('evaluate_batch', Population.evaluate_batch)
+        evolve = timed('evolve', Population.evolve)
+        self.update_tiles = timed('draw', self.update_tiles)
+        while not self.exit:
+            evaluate_batch(self.population, callback=self.update_tiles)
+            # a generation cut short by exiting isn't recorded, evolved or checkpointed
+            if self.exit:
+                break
+            self.instruments.record_generation(self.population)
+            evolve(self.population)
+            if self.checkpointer is not None:
+                self.checkpointer.update(self.population)
+        self.renderer.close()
+
+    def update_tiles(self, games):
+        """ handles input after every tick of a batch and draws all games when renderer's frame is due """
+        self.capture_input(None)
+        if self.exit:
+            games.game_over[:] = True
+            return
+        if self.screen_on:
+            ticks = self.renderer.is_due()
+            if ticks:
+                self.tiled_view.draw(games)
+                self.clock.tick(self.frame_rate / ticks)
 
     
     def update_objects(self, snake):
         snake.update()
     
     def capture_input(self, snake):
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
+        """ applies commands from input polled since last tick, blocking while game is paused """
+        if self.controls.poll():
+            self.apply_commands(snake)
+        while self.pause and not self.exit:
+            self.renderer.present()
+            self.controls.wait()
+            self.apply_commands(snake)
+
+    def apply_commands(self, snake):
+        commands = self.controls.commands
+        while commands:
+            command, value = commands.popleft()
+            if command == Command.EXIT:
                 self.exit = True
-            elif event.type == pygame.KEYDOWN:
-                if self.manual:
-                    if event.key == pygame.K_UP:
-                        snake.move(Direction.UP)
-                    elif event.key == pygame.K_DOWN:
-                        snake.move(Direction.DOWN)
-                    elif event.key == pygame.K_LEFT:
-                        snake.move(Direction.LEFT)
-                    elif event.key == pygame.K_RIGHT:
-                        snake.move(Direction.RIGHT)
-                
-                # keys to control frame rate
-                # u: 10000
-                # i: 100
-                # o: 10
-                # p: 1
-                if event.key == pygame.K_u:
-                    self.frame_rate = 10000
-                if event.key == pygame.K_i:
-                    self.frame_rate = 100
-                if event.key == pygame.K_o:
-                    self.frame_rate = 10
-                if event.key == pygame.K_p:
-                    self.frame_rate = 1
-                
-                # on pressing q current snake's game is over
-                if event.key == pygame.K_q:
-                    snake.game_over = True
-                
-                # s: draws screen
-                # a: stops drawing on screen
-                if event.key == pygame.K_a:
-                    self.screen_on = False
-                if event.key == pygame.K_s:
-                    self.screen_on = True
-                
-                # k: toggles pause
-                if event.key == pygame.K_k:
-                    self.pause = not self.pause
+            elif command == Command.PAUSE:
+                self.pause = not self.pause
+            elif command == Command.SPEED:
+                self.set_frame_rate(value)
+            elif command == Command.SKIP and snake is not None:
+                snake.game_over = True
+            elif command == Command.SCREEN:
+                self.screen_on = value
+                if value:
+                    self.renderer.redraw()
+            elif command == Command.MOVE and self.manual and snake is not None:
+                snake.move(value)
+
+    def set_frame_rate(self, frame_rate):
+        """ sets ticks per second, a frame is taken every few ticks so that at most 60 are drawn a second """
+        self.frame_rate = frame_rate
+        self.renderer.every = max(1, round(frame_rate / 60))
 
     def draw_objects(self, snake):
-        self.screen.fill(Color.BLACK)
-        snake.draw(self.screen)
-        pygame.display.update()
-        self.clock.tick(self.frame_rate)
+        # pacing once a frame is taken, for all ticks since the last one at frame rate
+        ticks = self.renderer.publish(snake)
+        if ticks:
+            self.clock.tick(self.frame_rate / ticks)
+
         
@@ -1,30 +1,176 @@
-from neural import NeuralNetwork
-from numpy import random, copy, array, ceil, array, sum, ravel
-from snake import Snake
+from collections import namedtuple
+from multiprocessing import shared_memory
+from time import perf_counter
+
+from batch import SnakeBatch
+from neural import FastNetwork, NeuralNetwork, StackedNetworks, genome_length, mutate, unflatten
+from numpy import random, copy, array, ceil, array, sum, ravel, dtype, empty, flatnonzero, float32, ndarray, prod, stack, where
+from objects import COLUMNS, ROWS, create_ground
+from optimizers import GeneticOptimizer
+from snake import Rules, Snake
+
+# summary of a generation yielded by Population.run, best genome is a copy
+GenerationResult = namedtuple('GenerationResult', (
+    'generation', 'best_fitness', 'mean_fitness', 'best_genome', 'steps',
+    'evaluate_seconds', 'evolve_seconds', 'elapsed',
+))
 
 class Individual:
-    def __init__(self, layers=None, weights=None):
-        self.snake = Snake()
-        if weights is None:
+    def __init__(self, layers=None, weights=None, seed=None, mutate_prob=0.03, genome=None, board=(ROWS, COLUMNS), rules=None):
+        self.seed = seed
+        self.board = board
+        self.rules = rules
+        # flat genome the network's weights are views into, if any
+        self.genome = genome
+        # snake is created when it's first needed, results of games
+        # played somewhere else are kept in score and items consumed
+        self.game = None
+        self.score = None
+        self.items_consumed = 0
+        self.steps = 0
+        self.episodes = 1
+        if genome is not None:
+            self.nn = NeuralNetwork(layers=layers, weights=unflatten(genome, layers), mutate_prob=0)
+        elif weights is None:
             self.nn = NeuralNetwork(layers=layers)
         else:
-            self.nn = NeuralNetwork(layers=layers, weights=weights)
+            self.nn = NeuralNetwork(layers=layers, weights=weights, mutate_prob=mutate_prob)
+
+    @property
+    def snake(self):
+        """ snake playing this individual's game """
+        if self.game is None:
+            self.game = Snake(self.seed, create_ground(*self.board), self.rules)
+        return self.game
+
+    def reset(self):
+        """ clears result of last game so that individual can play again """
+        self.game = None
+        self.score = None
+        self.items_consumed = 0
+        self.steps = 0
+        self.episodes = 1
     
     def find_fitness(self):
-        return self.snake.score
+        if self.score is None:
+            return self.snake.score
+        return self.score
+
+    def find_items_consumed(self):
+        if self.score is None:
+            return self.snake.items_consumed
+        return self.items_consumed
+
+    def find_steps(self):
+        """ number of ticks the individual's games lasted, over all of its episodes """
+        if self.score is None:
+            return self.snake.steps
+        return self.steps
+
+    def find_episodes(self):
+        """ number of games the individual played """
+        if self.score is None:
+            return 1
+        return self.episodes
+
+    def play(self, actions=None, fast=False):
+        """
+        plays snake's game with the neural network until it is over, without drawing
+        index of move made on every tick is appended to actions, if given
+        when fast, moves are decided by a float32 FastNetwork copy of the network
+        """
+        snake = self.snake
+        network = FastNetwork(self.nn.weights) if fast else None
+        while not snake.game_over:
+            snake.update()
+            if snake.game_over:
+                distance_from_food = snake.delta_distance
+                snake.score -= distance_from_food
+                break
+            if fast:
+                action = network.decide(snake.get_features())
+                if action != 1:
+                    snake.turn(action)
+            else:
+                y = ravel(self.nn.feed_forward(snake.get_features()))
+                action = snake.respond(y)
+            if actions is not None:
+                actions.append(action)
+        return snake.score
+
+    def finish(self, score, items_consumed, steps=0, episodes=1):
+        """ records the result of games played somewhere else, items consumed and steps summed over episodes """
+        self.score = score
+        self.items_consumed = items_consumed
+        self.steps = steps
+        self.episodes = episodes
 
 class Population:
-    def __init__(self, pop_size=20, mutate_prob=0.03, retain_unfit_prob=0.01, select=0.333, layers=None):
+    def __init__(self, pop_size=20, mutate_prob=0.03, retain_unfit_prob=0.01, select=0.333, layers=None, shared=False, genomes=None, board=(ROWS, COLUMNS), optimizer=None, rules=None):
         self.pop_size = pop_size
         self.mutate_prob = mutate_prob
         self.retain_unfit_prob = retain_unfit_prob
         self.select = select
         self.layers = layers
+        self.board = board           # rows and columns of boards games are played on
+        self.rules = rules or Rules()  # rules ending stalled games
+        # makes next generation out of this one, genetic algorithm by default
+        self.optimizer = optimizer or GeneticOptimizer()
+        # prints best fitness every 10 generations
+        self.verbose = True
         self.fitness_history = []
 
+        # genomes of all individuals, one per row of a contiguous float32 matrix
+        # optionally placed in shared memory so that worker processes can read it without copies
+        shape = (pop_size, genome_length(layers))
+        self.memory = None
+        if shared:
+            self.memory = shared_memory.SharedMemory(create=True, size=int(prod(shape)) * dtype(float32).itemsize)
+            self.genomes = ndarray(shape, dtype=float32, buffer=self.memory.buf)
+        else:
+            self.genomes = empty(shape, dtype=float32)
+        if genomes is None:
+            self.genomes[:] = 2*random.rand(*shape) - 1
+        else:
+            self.genomes[:] = genomes
+
         self.generation = 1
-        self.individuals = [Individual(layers=layers) for i in range(self.pop_size)]
+        self.individuals = self.create_individuals()
+
+    def create_individuals(self):
+        """ creates individuals whose networks are views into rows of genomes """
+        return [Individual(layers=self.layers, genome=genome, board=self.board, rules=self.rules) for genome in self.genomes]
+
+    def close(self):
+        """ releases shared memory holding genomes """
+        if self.memory is not None:
+            self.individuals = []
+            self.parents = []
+            self.networks = None
+            self.genomes = None
+            self.memory.close()
+            self.memory.unlink()
+            self.memory = None
     
+    def stack_networks(self):
+        """ weights of every individual's network stacked for batched inference, as views into genomes """
+        self.networks = StackedNetworks(unflatten(self.genomes, self.layers))
+
+    def feed_forward(self, X, individuals):
+        """ outputs of networks of given individuals for their rows of features X """
+        return self.networks.feed_forward(X, individuals)
+
+    def evaluate_batch(self, seed=None, callback=None):
+        """
+        plays games of all individuals at once using batched inference and records their scores,
+        callback is called with the SnakeBatch after every tick
+        """
+        self.stack_networks()
+        games = SnakeBatch(len(self.individuals), seed=seed, board=self.board, rules=self.rules)
+        games.play(self.feed_forward, callback)
+        for individual, score, items_consumed, steps in zip(self.individuals, games.score, games.items_consumed, games.steps):
+            individual.finish(score, items_consumed, steps)
+
     def grade(self):
         self.pop_fitness = max([i.find_fitness() for i in self.individuals])
         self.fitness_history.append(self.pop_fitness)
@@ -42,44 +188,110 @@ class Population:
         
         # reset properties of parents
         for individual in self.parents:
-            individual.snake.reset()
+            individual.reset()
 
     
     def crossover(self, weights1, weights2):
         """ combines the genes of two parent to form genes of child """
         weights = []
-
         for w1, w2 in zip(weights1, weights2):
-            w = []
-            for column1, column2 in zip(w1, w2):
-                column = []
-                for theta1, theta2 in zip(column1, column2):
-                    # selecting randomly from father or mother genes
-                    choosen = random.choice((theta1, theta2))       
-                    column.append(choosen)
-                w.append(column)
-            weights.append(array(w))
+            # selecting randomly from father or mother genes
+            mask = random.rand(*w1.shape) < 0.5
+            weights.append(where(mask, w1, w2))
         return weights
 
+    def choose_couples(self, parents_size, children_size):
+        """ returns indices of father and mother for each child, distinct whenever there are two parents """
+        fathers = random.randint(0, high=parents_size, size=children_size)
+        mothers = random.randint(0, high=parents_size, size=children_size)
+        if parents_size > 1:
+            same = flatnonzero(fathers == mothers)
+            while len(same):
+                mothers[same] = random.randint(0, high=parents_size, size=len(same))
+                same = same[fathers[same] == mothers[same]]
+        return fathers, mothers
+
+    def breed_genomes(self, genomes, children_size):
+        """
+        breeds children from flat parent genomes, one row per parent,
+        with uniform crossover and per gene mutation over whole arrays
+        """
+        fathers, mothers = self.choose_couples(len(genomes), children_size)
+        mask = random.rand(children_size, genomes.shape[1]) < 0.5
+        children = where(mask, genomes[fathers], genomes[mothers])
+        return mutate(children, self.mutate_prob)
+
     def breed(self):
         children_size = self.pop_size - len(self.parents)
-        children = []
         if len(self.parents) > 0:
-            while len(children) < children_size:
-                father = random.choice(self.parents)
-                mother = random.choice(self.parents)
-                if father != mother:
-                    child_weights = self.crossover(father.nn.weights, mother.nn.weights)
-                    child = Individual(layers=self.layers, weights=child_weights)
-                    children.append(child)
-            
-            self.individuals = self.parents + children
+            # parents move to the first rows of genomes, children fill the rest
+            genomes = stack([parent.genome for parent in self.parents])
+            children = self.breed_genomes(genomes, children_size)
+            self.genomes[:len(genomes)] = genomes
+            self.genomes[len(genomes):] = children
+            self.individuals = self.create_individuals()
+            # parents keep the seeds of their games, so that their results can be reused
+            for individual, parent in zip(self.individuals, self.parents):
+                individual.seed = parent.seed
 
     def evolve(self):
         self.grade()
-        self.select_parents()
-        self.breed()
+        self.optimizer.evolve(self)
 
-        if self.generation % 10 == 0:
+        if self.verbose and self.generation % 10 == 0:
             print(f'{self.generation}  --> {self.fitness_history[-1]/1000}') 
-        self.generation += 1
\ No newline at end of file
+        self.generation += 1
+
+    def run(self, evaluate=None, generations=None, time_budget=None, step_budget=None, patience=None, min_delta=0, seed=None):
+        """
+        evolves generation after generation, yielding a GenerationResult for each, until given
+        number of generations, seconds or steps are used up, or until best fitness of a generation
+        hasn't beaten the best so far by more than min_delta for patience generations.
+        games are played by evaluate called with the population, batched by default with food placed
+        from a seed spawned for each generation from seed, so that runs given a seed are reproducible.
+        Evaluator.evaluate can be passed instead to give every individual its own seed and cache results,
+        and has to be for boards larger than SPARSE_AREA, which batches don't play.
+        stopping early is as simple as no longer iterating, and setting verbose to False
+        keeps evolve from printing when many populations run in one process
+        """
+        if evaluate is None:
+            seeds = random.SeedSequence(seed)
+            def evaluate(population):
+                population.evaluate_batch(seed=int(seeds.spawn(1)[0].generate_state(1)[0]))
+        start = perf_counter()
+        count = 0
+        total_steps = 0
+        best = None
+        stale = 0
+        while generations is None or count < generations:
+            evaluate_start = perf_counter()
+            evaluate(self)
+            evaluate_end = perf_counter()
+
+            # results are read before evolving clears them
+            fitness = array([i.find_fitness() for i in self.individuals], dtype=float)
+            fittest = fitness.argmax()
+            best_genome = copy(self.individuals[fittest].genome)
+            steps = int(sum([i.find_steps() for i in self.individuals]))
+            generation = self.generation
+            self.evolve()
+            evolve_end = perf_counter()
+
+            count += 1
+            total_steps += steps
+            if best is None or fitness[fittest] > best + min_delta:
+                best = fitness[fittest]
+                stale = 0
+            else:
+                stale += 1
+            yield GenerationResult(
+                generation, float(fitness[fittest]), float(fitness.mean()), best_genome, steps,
+                evaluate_end - evaluate_start, evolve_end - evaluate_end, evolve_end - start,
+            )
+
+            if time_budget is not None and perf_counter() - start >= time_budget:
+                return
+            if step_budget is not None and total_steps >= step_budget:
+                return
+            if patience is not None and stale >= patience:
+                return
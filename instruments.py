@@ -0,0 +1,93 @@
+import json
+from collections import defaultdict
+from time import perf_counter
+
+from numpy import array, percentile
+
+
+class Instruments:
+    """
+    cumulative timers and counters for each phase of training, and statistics of every
+    generation streamed to a jsonl file, one line per generation
+
+    phases are timed by wrapping the functions that run them. when disabled, wrapping
+    returns the function itself and generations aren't recorded, so instrumented loops
+    run as fast as uninstrumented ones
+    """
+    def __init__(self, path=None, enabled=True):
+        self.enabled = enabled
+        self.times = defaultdict(float)      # seconds spent in each phase
+        self.calls = defaultdict(int)        # number of calls of each phase
+        self.counters = defaultdict(int)     # totals over all generations recorded
+        self.start_time = perf_counter()
+        self.generation_time = self.start_time
+        self.file = open(path, 'a') if enabled and path is not None else None
+
+    def timed(self, name, function):
+        """ returns function timing every call under phase name, or function itself when disabled """
+        if not self.enabled:
+            return function
+        times, calls = self.times, self.calls
+        def timed_function(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                times[name] += perf_counter() - start
+                calls[name] += 1
+        return timed_function
+
+    def get_phases(self):
+        """ returns cumulative seconds and calls of every phase timed so far """
+        return {name: {'seconds': self.times[name], 'calls': self.calls[name]} for name in self.times}
+
+    def record_generation(self, population):
+        """
+        records statistics of population's generation once all of its games are over,
+        before it evolves, returns them as a dict
+        """
+        if not self.enabled:
+            return None
+        now = perf_counter()
+        individuals = population.individuals
+        fitness = array([i.find_fitness() for i in individuals], dtype=float)
+        steps = array([i.find_steps() for i in individuals])
+        episodes = array([i.find_episodes() for i in individuals])
+        # lengths are per game, individuals may have played several episodes
+        lengths = steps / episodes
+        foods = int(sum(i.find_items_consumed() for i in individuals))
+        steps = int(steps.sum())
+        self.counters['generations'] += 1
+        self.counters['steps'] += steps
+        self.counters['foods'] += foods
+
+        stats = {
+            'generation': population.generation,
+            'seconds': now - self.generation_time,
+            'elapsed': now - self.start_time,
+            'steps': steps,
+            'foods': foods,
+            'mean_length': float(steps / episodes.sum()),
+            'max_length': float(lengths.max()),
+            'fitness': {
+                'min': float(fitness.min()),
+                'p25': float(percentile(fitness, 25)),
+                'median': float(percentile(fitness, 50)),
+                'p75': float(percentile(fitness, 75)),
+                'max': float(fitness.max()),
+                'mean': float(fitness.mean()),
+                'std': float(fitness.std()),
+            },
+            'totals': dict(self.counters),
+            'phases': self.get_phases(),
+        }
+        self.generation_time = now
+        if self.file is not None:
+            self.file.write(json.dumps(stats) + '\n')
+            self.file.flush()
+        return stats
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
@@ -0,0 +1,115 @@
+from multiprocessing import Pipe, Process
+
+from numpy import concatenate, random
+
+from evaluation import Evaluator
+from genetic import Population
+
+TOPOLOGIES = ('ring', 'full')
+
+
+def get_emigrants(population, size):
+    """ returns copies of genomes of population's fittest individuals, parents are the first rows once evolved """
+    size = min(size, int(population.select * population.pop_size))
+    return population.genomes[:size].copy()
+
+def immigrate(population, genomes):
+    """ replaces genomes of population's last children with immigrant genomes """
+    size = min(len(genomes), population.pop_size - int(population.select * population.pop_size))
+    if size > 0:
+        # individuals are views into genomes, so they play with the immigrants' networks
+        population.genomes[-size:] = genomes[:size]
+
+def run_island(connection, seed, population_options, evaluator_options):
+    """
+    evolves one island's population in its own process, following commands received on connection:
+    ('evolve', generations) replies with the fitness history of those generations and emigrants,
+    ('migrate', genomes) takes in immigrants and ('stop',) ends the island
+    """
+    random.seed(seed)
+    population = Population(**population_options)
+    evaluator = Evaluator(workers=1, seed=seed, **evaluator_options)
+    try:
+        while True:
+            command = connection.recv()
+            if command[0] == 'evolve':
+                _, generations, migrants = command
+                for i in range(generations):
+                    evaluator.evaluate(population)
+                    population.evolve()
+                connection.send((population.fitness_history[-generations:], get_emigrants(population, migrants)))
+            elif command[0] == 'migrate':
+                immigrate(population, command[1])
+            elif command[0] == 'stop':
+                return
+    finally:
+        evaluator.close()
+        connection.close()
+
+
+class Archipelago:
+    """
+    evolves independent populations on islands, each in its own process, and every few generations
+    sends the fittest individuals of each island to its neighbours, the previous island on a ring
+    or every other island when fully connected
+
+    islands only exchange commands and genomes over their connections, so they could as well
+    be connected through sockets of multiprocessing.connection. every island's random streams
+    are spawned from one seed, so runs are reproducible
+    """
+    def __init__(self, islands=4, topology='ring', migrants=2, every=10, seed=None, population_options=None, evaluator_options=None):
+        if topology not in TOPOLOGIES:
+            raise ValueError(f'topology must be one of {TOPOLOGIES}, not {topology}')
+        self.size = islands
+        self.topology = topology
+        self.migrants = migrants       # individuals sent by each island on every migration
+        self.every = every             # generations between migrations
+        self.generation = 1
+        self.fitness_history = [[] for i in range(islands)]
+
+        seeds = [int(s.generate_state(1)[0]) for s in random.SeedSequence(seed).spawn(islands)]
+        self.connections = []
+        self.processes = []
+        for island_seed in seeds:
+            connection, island_connection = Pipe()
+            process = Process(
+                target=run_island,
+                args=(island_connection, island_seed, population_options or {}, evaluator_options or {}),
+                daemon=True,
+            )
+            process.start()
+            self.connections.append(connection)
+            self.processes.append(process)
+
+    def get_neighbours(self, index):
+        """ returns indices of islands that island at index receives migrants from """
+        if self.topology == 'ring':
+            return [(index - 1) % self.size] if self.size > 1 else []
+        return [other for other in range(self.size) if other != index]
+
+    def evolve(self, generations=None):
+        """ evolves every island for given generations, every few by default, then migrates, returns best fitness of each island """
+        generations = generations or self.every
+        for connection in self.connections:
+            connection.send(('evolve', generations, self.migrants))
+        emigrants = []
+        for index, connection in enumerate(self.connections):
+            history, genomes = connection.recv()
+            self.fitness_history[index].extend(history)
+            emigrants.append(genomes)
+        self.generation += generations
+
+        for index, connection in enumerate(self.connections):
+            neighbours = self.get_neighbours(index)
+            if neighbours:
+                connection.send(('migrate', concatenate([emigrants[other] for other in neighbours])))
+        return [history[-1] for history in self.fitness_history]
+
+    def close(self):
+        """ stops every island's process """
+        for connection in self.connections:
+            connection.send(('stop',))
+        for process in self.processes:
+            process.join()
+        self.connections = []
+        self.processes = []
@@ -1,4 +1,34 @@
-from numpy import random, dot, exp
+from numpy import ascontiguousarray, concatenate, random, dot, empty, exp, float32, float64, matmul, ones, tanh, zeros
+
+
+def flatten(weights):
+    """ concatenates weights of all layers into one flat genome """
+    return concatenate([w.ravel() for w in weights])
+
+def genome_length(layers):
+    """ number of weights in a network of given layers """
+    return sum(layers[i] * layers[i+1] for i in range(len(layers) - 1))
+
+def unflatten(genome, layers):
+    """
+    splits a flat genome into weights of each layer, as views into the genome
+    a matrix of genomes, one per row, gives weights stacked as (genomes, in, out)
+    """
+    weights = []
+    start = 0
+    for i in range(len(layers) - 1):
+        end = start + layers[i] * layers[i+1]
+        shape = genome.shape[:-1] + (layers[i], layers[i+1])
+        weights.append(genome[..., start:end].reshape(shape))
+        start = end
+    return weights
+
+def mutate(genes, mutate_prob):
+    """ replaces each gene with a new random value with probability mutate_prob, in place """
+    mask = random.rand(*genes.shape) < mutate_prob
+    genes[mask] = 2*random.rand(mask.sum()) - 1
+    return genes
+
 
 class NeuralNetwork:
     def __init__(self, layers=None, weights=None, mutate_prob=0.03):
@@ -10,10 +40,9 @@ class NeuralNetwork:
                 self.weights.append(w)
         else:
             # mutate the genes
-            for column in weights:
-                for i in range(len(column)):
-                    if mutate_prob > random.rand():
-                        column[i] = 2*random.rand() - 1
+            if mutate_prob > 0:
+                for w in weights:
+                    mutate(w, mutate_prob)
             self.weights = weights
         
         self.number_of_layers = len(self.weights) + 1
@@ -28,3 +57,74 @@ class NeuralNetwork:
             l = self.sigmoid(dot(w.T, l))
         self.y = l
         return self.y
+
+
+class StackedNetworks:
+    """ networks of the same layers with weights of each layer stacked into (networks, in, out) tensors """
+    def __init__(self, weights):
+        self.weights = weights
+        self.number_of_layers = len(self.weights) + 1
+
+    sigmoid = NeuralNetwork.sigmoid
+
+    def feed_forward(self, X, networks):
+        """
+        feeds one row of features through each of the given networks
+        with one batched matrix product per layer, returns one row of outputs per network
+        """
+        l = X[:, None, :]
+        for i in range(self.number_of_layers - 1):
+            w = self.weights[i][networks]
+            l = self.sigmoid(matmul(l, w))
+        return l[:, 0, :]
+
+
+class FastNetwork:
+    """
+    inference only copy of a network, deciding moves with as little work per call as possible
+
+    sigmoid(z) is (tanh(z / 2) + 1) / 2, so the halving and shift of every hidden layer's
+    sigmoid are folded into the weights of the layer after it, leaving one product and one
+    tanh per layer. weights are transposed once, with a last column of biases multiplied by
+    a constant 1 kept at the end of every activation buffer. output layer's sigmoid is skipped,
+    argmax and comparing outputs against 0.5 only need its sign
+    """
+    def __init__(self, weights, dtype=float32):
+        self.layers = []
+        buffer = ones(weights[0].shape[0] + 1, dtype=dtype)
+        self.inputs = buffer[:-1]
+        for i, w in enumerate(weights):
+            # pre-activation of this layer in terms of tanh of the previous one
+            w = w.T.astype(float64)
+            if i == 0:
+                matrix, bias = w, zeros(len(w))
+            else:
+                matrix, bias = w / 2, w.sum(axis=1) / 2
+            last = i == len(weights) - 1
+            if not last:
+                # tanh takes half of the pre-activation
+                matrix, bias = matrix / 2, bias / 2
+            matrix = ascontiguousarray(concatenate((matrix, bias[:, None]), axis=1), dtype=dtype)
+            output = empty(len(w), dtype=dtype) if last else ones(len(w) + 1, dtype=dtype)
+            self.layers.append((matrix, buffer, output[:len(w)]))
+            buffer = output
+        self.y = buffer
+
+    def feed_forward(self, X):
+        """ returns output layer's pre-activations for features X, in a buffer reused by the next call """
+        self.inputs[:] = X.ravel()
+        for matrix, inputs, outputs in self.layers[:-1]:
+            dot(matrix, inputs, out=outputs)
+            tanh(outputs, out=outputs)
+        matrix, inputs, outputs = self.layers[-1]
+        dot(matrix, inputs, out=outputs)
+        return self.y
+
+    def decide(self, X):
+        """ returns index of move Snake.respond would make on the network's output for features X """
+        z = self.feed_forward(X)
+        index = z.argmax()
+        # sigmoid is above 0.5 exactly when its input is above 0
+        if z[index] > 0:
+            return int(index)
+        return 1
@@ -1,29 +1,71 @@
+from bisect import bisect_left, bisect_right, insort
+from functools import lru_cache
+from itertools import accumulate
 from math import pow, sqrt
 
-import pygame
-from numpy import array, concatenate, int32, random, ravel, reshape, zeros, argmax
+from numpy import arange, array, concatenate, int32, random, ravel, reshape, uint8, zeros, argmax
 
+# default board, drawn as a 640x480 window of 10px cells
+ROWS, COLUMNS = 48, 64
+# boards with more cells than this keep occupied cells in a set rather than a grid
+SPARSE_AREA = 1 << 16
+
+
+@lru_cache(maxsize=None)
+def get_step_lengths(steps):
+    """
+    distance covered after each number of straight and diagonal steps,
+    summed step by step the same way a walk along the ray would
+    """
+    return (tuple(range(steps + 1)), tuple(accumulate([0] + [sqrt(2)] * steps)))
+
+@lru_cache(maxsize=None)
+def get_cells(area):
+    """ packed cells of a board of given area in order, copied rather than rebuilt for every ground """
+    return arange(area, dtype=int32)
+
+def create_ground(rows=ROWS, columns=COLUMNS, sparse=None):
+    """ returns an empty ground, sparse if asked to or by default when board is large """
+    if sparse is None:
+        sparse = rows * columns > SPARSE_AREA
+    return SparseGround(rows, columns) if sparse else Ground(rows, columns)
 
 
 class Ground:
-    def __init__(self):
-        # pixel dimensions
-        self.width = 640
-        self.height = 480
-        self.box_width = 10
+    """
+    board of rows by columns cells, occupied cells are kept in a uint8 grid along with
+    an array of free cells to place food on, both as large as the board
+
+    once a journal is started every change of a cell is recorded, so that changes can be
+    undone back to any earlier position of the journal in time proportional to their number
+    """
+    __slots__ = (
+        'width', 'height', 'box_width', 'rows', 'columns', 'diagonal', 'grid', 'lines', 'step_lengths',
+        'free', 'free_index', 'free_count', 'journal',
+    )
+
+    def __init__(self, rows=ROWS, columns=COLUMNS, box_width=10):
         # grid dimensions
-        self.rows = int(self.height / self.box_width)
-        self.columns = int(self.width /self.box_width)
+        self.rows = rows
+        self.columns = columns
         self.diagonal = sqrt(pow(self.rows, 2) + pow(self.columns, 2))
+        # pixel dimensions when drawn with cells of box_width pixels
+        self.box_width = box_width
+        self.width = self.columns * self.box_width
+        self.height = self.rows * self.box_width
         # grid layout
-        self.grid = zeros((self.rows, self.columns), dtype=int32)
+        self.reset_grid()
+        self.step_lengths = get_step_lengths(max(self.rows, self.columns))
 
     def get_dimensions(self):
         """ returns grid dimensions """
         return (self.width, self.height)
     
     def get_rect(self, p1, p2):
-        """ returns pygame's rectangle object for rectangle created by two points on grid """
+        """
+        returns rectangle created by two points on grid as (left, top, width, height),
+        which pygame accepts wherever it takes a rect
+        """
         x1_, y1_ = p1
         x2_, y2_ = p2
         # vertical grid
@@ -39,28 +81,223 @@ class Ground:
             width = (abs(x1_ - x2_) + 1) * self.box_width
             height = self.box_width
 
-        return pygame.Rect(left, top, width, height)
+        return (left, top, width, height)
     
+    def pack(self, x_, y_):
+        """ packs a point into a single integer cell """
+        return y_ * self.columns + x_
+
+    def unpack(self, cell):
+        """ returns point of a packed cell """
+        y_, x_ = divmod(cell, self.columns)
+        return (x_, y_)
+
     def is_inside_grid(self, x_, y_):
         """ checks if a point lies inside the grid """
         return (x_ >= 0 and y_ >= 0 and x_ < self.columns and y_ < self.rows)
     
     def reset_grid(self):
         """ resets entire grid layout to initial state """
-        self.grid = zeros((self.rows, self.columns), dtype=int32)
-    
+        self.grid = zeros((self.rows, self.columns), dtype=uint8)
+        # occupied cells of each row, column and diagonal, kept sorted by position along the line
+        self.lines = {}
+        self.reset_free_cells()
+
+    def reset_free_cells(self):
+        """
+        marks every cell free, free cells are kept as packed cells in the first free_count
+        entries of an array along with position of each cell in that array, -1 for occupied cells
+        """
+        cells = get_cells(self.rows * self.columns)
+        self.free = cells.copy()
+        self.free_index = cells.copy()
+        self.free_count = len(cells)
+        self.journal = None
+
+    def start_journal(self):
+        """ starts recording changes of cells if not recording yet, returns position to undo back to """
+        if self.journal is None:
+            self.journal = []
+        return len(self.journal)
+
+    def stop_journal(self, position):
+        """ stops recording once the journal's first position isn't going to be undone back to """
+        if position == 0:
+            self.journal = None
+
+    def undo(self, position):
+        """ undoes changes of cells recorded since position, latest first """
+        while len(self.journal) > position:
+            self.revert(*self.journal.pop())
+
+    def revert(self, cell, value, index):
+        """ undoes setting cell to value, index being where the cell was in the array of free cells """
+        x_, y_ = self.unpack(cell)
+        if value == 1:
+            # putting cell back in its place and the cell swapped into it back at the end
+            if index < self.free_count:
+                last = self.free[index]
+                self.free_index[last] = self.free_count
+                self.free[self.free_count] = last
+                self.free[index] = cell
+            else:
+                self.free[self.free_count] = cell
+            self.free_index[cell] = index
+            self.free_count += 1
+        else:
+            self.free_count -= 1
+            self.free_index[cell] = -1
+        self.grid[y_][x_] = 1 - value
+        self.mark_lines(x_, y_, 1 - value)
+
+    def choose_free_cell(self, random):
+        """ returns a free cell drawn with given random state, None if there is none """
+        if not self.free_count:
+            return None
+        return int(self.free[random.randint(0, high=self.free_count)])
+
+    def is_occupied(self, x_, y_):
+        """ checks if a point inside grid is occupied """
+        return self.grid[y_][x_] == 1
+
+    def find_line(self, x_, y_, deltax, deltay):
+        """ returns key of line through a point along delta and position of the point on that line """
+        if deltay == 0:
+            return (0, y_), x_
+        elif deltax == 0:
+            return (1, x_), y_
+        elif deltax == deltay:
+            return (2, x_ - y_), x_
+        else:
+            return (3, x_ + y_), x_
+
+    def mark(self, x_, y_, value):
+        """ sets value of a cell inside grid and keeps lines of occupied cells up to date """
+        if self.grid[y_][x_] == value:
+            return
+        self.grid[y_][x_] = value
+        cell = self.pack(x_, y_)
+        if self.journal is not None:
+            self.journal.append((cell, value, int(self.free_index[cell])))
+        if value == 1:
+            # swapping last free cell into the occupied cell's place
+            i = self.free_index[cell]
+            self.free_count -= 1
+            last = self.free[self.free_count]
+            self.free[i] = last
+            self.free_index[last] = i
+            self.free_index[cell] = -1
+        else:
+            self.free_index[cell] = self.free_count
+            self.free[self.free_count] = cell
+            self.free_count += 1
+        self.mark_lines(x_, y_, value)
+
+    def mark_lines(self, x_, y_, value):
+        """ adds or removes a cell from the lines of occupied cells through it """
+        for deltax, deltay in ((1, 0), (0, 1), (1, 1), (1, -1)):
+            key, position = self.find_line(x_, y_, deltax, deltay)
+            line = self.lines.setdefault(key, [])
+            if value == 1:
+                insort(line, position)
+            else:
+                del line[bisect_left(line, position)]
+
+    def find_wall_distance(self, x_, y_, deltax, deltay):
+        """ distance covered walking from a point along delta before leaving the grid """
+        steps = max(self.rows, self.columns)
+        if deltax:
+            steps = min(steps, x_ if deltax < 0 else self.columns - 1 - x_)
+        if deltay:
+            steps = min(steps, y_ if deltay < 0 else self.rows - 1 - y_)
+        return self.step_lengths[abs(deltax * deltay)][steps]
+
+    def find_occupied_distance(self, x_, y_, deltax, deltay):
+        """ distance covered walking from a point along delta before reaching an occupied cell, None if there is none """
+        key, position = self.find_line(x_, y_, deltax, deltay)
+        line = self.lines.get(key)
+        if not line:
+            return None
+        if (deltax or deltay) > 0:
+            i = bisect_right(line, position)
+            if i == len(line):
+                return None
+            steps = line[i] - position
+        else:
+            i = bisect_left(line, position)
+            if i == 0:
+                return None
+            steps = position - line[i - 1]
+        return self.step_lengths[abs(deltax * deltay)][steps - 1]
+
+
+class SparseGround(Ground):
+    """
+    ground keeping only the set of occupied cells, so that memory and time per step
+    depend on snake's length rather than the board's area. food is placed by drawing
+    cells until a free one comes up, listing free cells only once most are occupied
+    """
+    __slots__ = ('occupied',)
+
+    def reset_grid(self):
+        self.grid = None
+        self.occupied = set()
+        self.lines = {}
+        self.journal = None
+
+    def reset_free_cells(self):
+        self.journal = None
+
+    def revert(self, cell, value, index):
+        x_, y_ = self.unpack(cell)
+        if value == 1:
+            self.occupied.discard(cell)
+        else:
+            self.occupied.add(cell)
+        self.mark_lines(x_, y_, 1 - value)
+
+    def choose_free_cell(self, random):
+        area = self.rows * self.columns
+        if len(self.occupied) >= area:
+            return None
+        if 2 * len(self.occupied) < area:
+            while True:
+                cell = random.randint(0, high=area)
+                if cell not in self.occupied:
+                    return cell
+        free = [cell for cell in range(area) if cell not in self.occupied]
+        return free[random.randint(0, high=len(free))]
+
+    def is_occupied(self, x_, y_):
+        return self.pack(x_, y_) in self.occupied
+
+    def mark(self, x_, y_, value):
+        cell = self.pack(x_, y_)
+        if (cell in self.occupied) == (value == 1):
+            return
+        if self.journal is not None:
+            self.journal.append((cell, value, None))
+        if value == 1:
+            self.occupied.add(cell)
+        else:
+            self.occupied.discard(cell)
+        self.mark_lines(x_, y_, value)
+
 
 class Food:
-    def __init__(self):
+    __slots__ = ('value', 'random', 'x_', 'y_')
+
+    def __init__(self, seed=None):
         self.value = 1000        # score increased upon consuming it
+        # own random stream so that games are reproducible from their seed
+        self.random = random.RandomState(seed)
 
     def get_new_position(self, ground):
-        """ finds new poisition for food on ground that's free """
-        while True:
-            x_ = random.randint(0, high=ground.columns)
-            y_ = random.randint(0, high=ground.rows)
-            if ground.grid[y_][x_] == 0:
-                break
+        """ finds new poisition for food on ground that's free, None if ground is full """
+        cell = ground.choose_free_cell(self.random)
+        if cell is None:
+            return None
+        x_, y_ = ground.unpack(cell)
         
         self.x_, self.y_ = x_, y_
         return (x_, y_)
@@ -0,0 +1,80 @@
+from numpy import arange, argsort, array, empty, float32, random
+
+
+def get_centered_ranks(fitness):
+    """ returns ranks of fitness scaled into [-0.5, 0.5], fittest highest """
+    ranks = empty(len(fitness))
+    ranks[argsort(fitness, kind='stable')] = arange(len(fitness))
+    if len(fitness) > 1:
+        ranks /= len(fitness) - 1
+    return ranks - 0.5
+
+
+class GeneticOptimizer:
+    """ truncation selection of parents, who are kept, and uniform crossover with mutation for children """
+    name = 'ga'
+
+    def evolve(self, population):
+        """ writes next generation's genomes into population and creates its individuals """
+        population.select_parents()
+        population.breed()
+
+    def get_state(self):
+        """ returns arrays needed to resume optimizing """
+        return {}
+
+    def set_state(self, state):
+        pass
+
+
+class EvolutionStrategy:
+    """
+    OpenAI-ES style optimizer: individuals are antithetic pairs of gaussian perturbations of a
+    center genome, and the center moves along the perturbations weighted by centered ranks of
+    their fitness. the center starts as the fittest genome of the first generation
+    """
+    name = 'es'
+
+    def __init__(self, sigma=0.1, learning_rate=0.03):
+        self.sigma = sigma                   # scale of perturbations
+        self.learning_rate = learning_rate
+        self.center = None
+
+    def evolve(self, population):
+        genomes = population.genomes
+        fitness = array([i.find_fitness() for i in population.individuals])
+        if self.center is None:
+            self.center = genomes[fitness.argmax()].copy()
+        else:
+            self.center += (self.learning_rate * self.estimate_gradient(genomes, fitness)).astype(float32)
+        self.sample(genomes)
+        population.individuals = population.create_individuals()
+
+    def estimate_gradient(self, genomes, fitness):
+        """ gradient of fitness at center, from genomes sampled around it and their fitness """
+        half = len(genomes) // 2
+        weights = get_centered_ranks(fitness)
+        noise = (genomes[:half] - self.center) / self.sigma
+        return (weights[:half] - weights[half:2 * half]) @ noise / (2 * half * self.sigma)
+
+    def sample(self, genomes):
+        """ fills genomes with antithetic perturbations of center, the center itself in an odd last row """
+        half = len(genomes) // 2
+        noise = self.sigma * random.randn(half, genomes.shape[1]).astype(float32)
+        genomes[:half] = self.center + noise
+        genomes[half:2 * half] = self.center - noise
+        if len(genomes) % 2:
+            genomes[-1] = self.center
+
+    def get_state(self):
+        state = {'hyperparameters': array((self.sigma, self.learning_rate))}
+        if self.center is not None:
+            state['center'] = self.center
+        return state
+
+    def set_state(self, state):
+        self.sigma, self.learning_rate = (float(value) for value in state['hyperparameters'])
+        self.center = state['center'].copy() if 'center' in state else None
+
+
+OPTIMIZERS = {optimizer.name: optimizer for optimizer in (GeneticOptimizer, EvolutionStrategy)}
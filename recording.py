@@ -0,0 +1,65 @@
+import os
+import struct
+from collections import namedtuple
+
+from objects import COLUMNS, ROWS, create_ground
+from snake import Rules, Snake
+
+# a game as the seed its food was placed with, the index of move made on every tick,
+# 0 for left, 1 for straight and 2 for right, rows and columns of its board and its rules
+Episode = namedtuple('Episode', ('seed', 'actions', 'board', 'rules'), defaults=((ROWS, COLUMNS), Rules()))
+
+MAGIC = b'SNEP'
+# magic, seed, number of ticks, rows, columns, whether loops are detected,
+# loop penalty and steps without food allowed, 0 for default
+HEADER = struct.Struct('<4sQIII?dI')
+
+
+def write(episode, path):
+    """ writes episode to path as a small header followed by one byte per tick """
+    rules = episode.rules
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(
+            MAGIC, episode.seed, len(episode.actions), *episode.board,
+            rules.detect_loops, rules.loop_penalty, rules.max_steps_since_food or 0,
+        ))
+        f.write(episode.actions)
+
+def read(path):
+    """ reads episode written to path """
+    with open(path, 'rb') as f:
+        magic, seed, ticks, rows, columns, detect_loops, loop_penalty, max_steps_since_food = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a recorded episode')
+        actions = f.read(ticks)
+    return Episode(seed, actions, (rows, columns), Rules(detect_loops, loop_penalty, max_steps_since_food or None))
+
+def replay(episode, start=0):
+    """
+    rebuilds the game of an episode, yielding tick number and snake after every tick from start on,
+    ticks before start are played without being yielded
+    """
+    snake = Snake(episode.seed, create_ground(*episode.board), episode.rules)
+    tick = 0
+    while not snake.game_over:
+        snake.update()
+        if snake.game_over:
+            snake.score -= snake.delta_distance
+        if tick >= start:
+            yield tick, snake
+        if snake.game_over or tick >= len(episode.actions):
+            break
+        snake.turn(episode.actions[tick])
+        tick += 1
+
+
+class Recorder:
+    """ saves an episode for each generation into a directory """
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def save(self, episode, generation):
+        path = os.path.join(self.directory, f'generation-{generation:08d}.episode')
+        write(episode, path)
+        return path
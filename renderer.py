@@ -0,0 +1,202 @@
+from math import ceil, sqrt
+from threading import Condition, Thread
+from time import perf_counter
+
+import pygame
+from numpy import array, uint8, where, zeros
+
+from utilities import Color
+
+# largest window drawn into, in pixels
+WINDOW = (640, 480)
+
+
+def fit_box_width(rows, columns, window=WINDOW):
+    """ returns largest width of a cell in pixels that fits a board in window, at least a pixel """
+    width, height = window
+    return max(1, min(width // columns, height // rows))
+
+
+class Renderer:
+    """
+    draws games onto the screen, updating only the cells that changed since the last frame drawn
+
+    simulation publishes every tick, but a frame is only taken every few ticks or at a fixed
+    wall clock rate. when threaded, a separate thread works out the cells that changed in the
+    latest frame published while simulation goes on, and those cells are drawn on the next
+    publish, as the display only takes updates from the thread that opened it
+    """
+    def __init__(self, screen, every=1, fps=None, threaded=False, box_width=10):
+        self.screen = screen
+        self.box_width = box_width   # pixels per cell, independent of ground's own box width
+        self.every = every           # draws every nth tick
+        self.fps = fps               # or at most fps frames per second of wall clock time
+        self.ticks = 0
+        self.last_frame_tick = 0
+        self.last_frame_time = 0
+        # frame last prepared for drawing
+        self.cells = set()
+        self.food = None
+        self.full_redraw = True
+
+        # frame waiting to be prepared and prepared frames waiting to be drawn, guarded by condition
+        self.frame = None
+        self.prepared = []
+        self.condition = Condition()
+        self.running = threaded
+        self.thread = None
+        if threaded:
+            self.thread = Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+    def is_due(self):
+        """ checks if a frame should be taken on this tick, returns ticks since last frame taken or 0 if not due """
+        self.ticks += 1
+        if self.fps is not None:
+            now = perf_counter()
+            if now - self.last_frame_time < 1 / self.fps:
+                return 0
+            self.last_frame_time = now
+        elif self.ticks % self.every:
+            return 0
+        ticks, self.last_frame_tick = self.ticks - self.last_frame_tick, self.ticks
+        return ticks
+
+    def publish(self, snake):
+        """
+        takes a frame of snake's game if one is due, drawing it now or handing it to preparing thread,
+        returns ticks since last frame taken, 0 if no frame was taken
+        """
+        if self.thread is not None:
+            self.present()
+        ticks = self.is_due()
+        if not ticks:
+            return 0
+        frame = (snake.ground, set(snake.body), snake.food.get_current_position())
+        if self.thread is None:
+            self.draw(*self.prepare(frame))
+        else:
+            with self.condition:
+                self.frame = frame
+                self.condition.notify()
+        return ticks
+
+    def redraw(self):
+        """ makes next frame redraw the whole screen """
+        with self.condition:
+            self.full_redraw = True
+
+    def prepare(self, frame):
+        """
+        returns whether whole screen is redrawn along with rects of cells that changed
+        between last frame prepared and this one and their colors
+        """
+        ground, cells, food = frame
+        with self.condition:
+            full_redraw, self.full_redraw = self.full_redraw, False
+        if full_redraw:
+            self.cells, self.food = set(), None
+        rects = []
+
+        # erasing vacated cells and old food, then drawing new cells and food
+        for cell in self.cells - cells:
+            rects.append((self.get_rect(ground.unpack(cell)), Color.BLACK))
+        if self.food is not None and self.food != food:
+            rects.append((self.get_rect(self.food), Color.BLACK))
+        for cell in cells - self.cells:
+            rects.append((self.get_rect(ground.unpack(cell)), Color.WHITE))
+        if food != self.food:
+            rects.append((self.get_rect(food), Color.RED))
+        self.cells, self.food = cells, food
+        return full_redraw, rects
+
+    def present(self):
+        """ draws frames prepared by preparing thread, on the thread that opened the display """
+        with self.condition:
+            prepared, self.prepared = self.prepared, []
+        for full_redraw, rects in prepared:
+            self.draw(full_redraw, rects)
+
+    def draw(self, full_redraw, rects):
+        """ draws a prepared frame and updates the screen where it changed """
+        if full_redraw:
+            self.screen.fill(Color.BLACK)
+        for rect, color in rects:
+            pygame.draw.rect(self.screen, color, rect)
+        if full_redraw:
+            pygame.display.update()
+        else:
+            pygame.display.update([rect for rect, color in rects])
+
+    def get_rect(self, point):
+        x_, y_ = point
+        return (x_ * self.box_width, y_ * self.box_width, self.box_width, self.box_width)
+
+    def run(self):
+        """ prepares latest published frame whenever there is one, on preparing thread """
+        while True:
+            with self.condition:
+                while self.running and self.frame is None:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                frame, self.frame = self.frame, None
+            prepared = self.prepare(frame)
+            with self.condition:
+                self.prepared.append(prepared)
+
+    def close(self):
+        """ stops preparing thread, drawing what it has prepared and the last frame published """
+        if self.thread is not None:
+            with self.condition:
+                self.running = False
+                self.condition.notify()
+            self.thread.join()
+            self.thread = None
+            self.present()
+            if self.frame is not None:
+                frame, self.frame = self.frame, None
+                self.draw(*self.prepare(frame))
+
+
+class TiledView:
+    """
+    draws every game of a batch as a tile of one image, built from their occupancy grids
+    and uploaded to the screen as a single pixel array, one pixel per cell scaled to fit
+    """
+    BORDER = (60, 60, 60)
+    FINISHED = (90, 90, 90)
+
+    def __init__(self, screen, size, rows, columns):
+        self.screen = screen
+        self.rows = rows
+        self.columns = columns
+        # as many tiles across as fit closest to the screen's aspect ratio
+        width, height = screen.get_size()
+        self.tiles_across = max(1, min(size, round(sqrt(size * width * (rows + 1) / (height * (columns + 1))))))
+        self.tiles_down = ceil(size / self.tiles_across)
+
+    def draw(self, games):
+        """ draws all games of a SnakeBatch """
+        tiles = zeros((self.tiles_down * self.tiles_across, self.rows + 1, self.columns + 1, 3), dtype=uint8)
+        tiles[:, -1, :] = self.BORDER
+        tiles[:, :, -1] = self.BORDER
+
+        # snake's cells, dimmed for finished games, and food
+        size = games.size
+        color = where(games.game_over[:, None], array(self.FINISHED), array(Color.WHITE)).astype(uint8)
+        tiles[:size, :-1, :-1] = games.grid[..., None] * color[:, None, None, :]
+        live = games.live_games()
+        tiles[live, games.food_y[live], games.food_x[live]] = Color.RED
+
+        # laying tiles out as rows of tiles, then uploading as one surface
+        image = tiles.reshape(self.tiles_down, self.tiles_across, self.rows + 1, self.columns + 1, 3)
+        image = image.transpose(0, 2, 1, 3, 4).reshape(self.tiles_down * (self.rows + 1), -1, 3)
+        surface = pygame.surfarray.make_surface(image.swapaxes(0, 1))
+        # shrinking averages pixels so that thin borders and snakes don't drop out
+        width, height = self.screen.get_size()
+        if surface.get_width() > width or surface.get_height() > height:
+            pygame.transform.smoothscale(surface, (width, height), self.screen)
+        else:
+            pygame.transform.scale(surface, (width, height), self.screen)
+        pygame.display.update()
@@ -0,0 +1,42 @@
+import argparse
+
+import pygame
+
+import recording
+from renderer import Renderer, fit_box_width
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Replays a recorded episode')
+    parser.add_argument('path', help='episode file written while training')
+    parser.add_argument('--speed', type=int, default=30, help='ticks per second, 0 to replay as fast as possible')
+    parser.add_argument('--seek', type=int, default=0, help='tick to start showing the game from')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    episode = recording.read(args.path)
+
+    pygame.init()
+    pygame.display.set_caption(f'Snake - {args.path}')
+    rows, columns = episode.board
+    box_width = fit_box_width(rows, columns)
+    screen = pygame.display.set_mode((columns * box_width, rows * box_width))
+    clock = pygame.time.Clock()
+    renderer = Renderer(screen, box_width=box_width)
+
+    snake = None
+    for tick, snake in recording.replay(episode, start=args.seek):
+        if any(event.type == pygame.QUIT for event in pygame.event.get()):
+            break
+        if not snake.game_over:
+            renderer.publish(snake)
+        if args.speed > 0:
+            clock.tick(args.speed)
+
+    if snake is not None:
+        print(f'tick {tick}: score {snake.score}, items consumed {snake.items_consumed}')
+    pygame.quit()
+
+if __name__=='__main__':
+    main()
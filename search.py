@@ -0,0 +1,114 @@
+from collections import deque
+
+from numpy import zeros
+
+from utilities import DELTAS, Direction
+
+
+class SearchController:
+    """
+    baseline player that searches the board instead of using a neural network
+
+    every tick it finds the shortest path to food with breadth first search and rolls it out
+    on the snake itself, the path is taken only if afterwards the head can still reach the tail,
+    otherwise it takes the safe move that keeps the tail farthest away. rollouts are undone
+    by restoring a snapshot taken before them
+    """
+    def __init__(self):
+        self.rollouts = 0            # counts moves rolled out
+
+    def get_moves(self, snake):
+        """ returns directions for turning left, going straight and turning right """
+        left_direction = Direction.get_direction_to_left(snake.direction)
+        right_direction = Direction.get_opposite_direction(left_direction)
+        return (left_direction, snake.direction, right_direction)
+
+    def find_path(self, snake, goal):
+        """
+        returns directions leading head to goal cell through free cells, shortest first,
+        goal itself may be occupied, None if goal can't be reached
+        """
+        ground = snake.ground
+        start = ground.pack(*snake.head)
+        previous = {start: None}
+        queue = deque((start,))
+        while queue:
+            cell = queue.popleft()
+            if cell == goal:
+                path = []
+                while previous[cell] is not None:
+                    cell, direction = previous[cell]
+                    path.append(direction)
+                return path[::-1]
+            x_, y_ = ground.unpack(cell)
+            for direction in (Direction.LEFT, Direction.RIGHT, Direction.UP, Direction.DOWN):
+                deltax, deltay = DELTAS[direction]
+                point = (x_ + deltax, y_ + deltay)
+                if not ground.is_inside_grid(*point):
+                    continue
+                neighbour = ground.pack(*point)
+                if neighbour in previous or (ground.is_occupied(*point) and neighbour != goal):
+                    continue
+                previous[neighbour] = (cell, direction)
+                queue.append(neighbour)
+        return None
+
+    def roll_out(self, snake, directions):
+        """ plays directions on snake, returns False if snake dies on the way """
+        for direction in directions:
+            snake.move(direction)
+            snake.update()
+            self.rollouts += 1
+            if snake.game_over:
+                return snake.won
+        return True
+
+    def is_safe(self, snake):
+        """ checks if snake is alive and its head can reach its tail """
+        if snake.game_over:
+            return snake.won
+        return self.find_path(snake, snake.body[-1]) is not None
+
+    def choose(self, snake):
+        """ returns index of move to make, 0 for left, 1 for straight and 2 for right """
+        moves = self.get_moves(snake)
+        state = snake.snapshot()
+        try:
+            # shortest path to food, if it is safe to follow
+            path = self.find_path(snake, snake.ground.pack(*snake.food.get_current_position()))
+            if path and path[0] in moves:
+                if self.roll_out(snake, path) and self.is_safe(snake):
+                    return moves.index(path[0])
+                snake.restore(state)
+
+            # otherwise the safe move keeping tail farthest, or any move that survives
+            best, best_distance = 1, None
+            for index, direction in enumerate(moves):
+                if self.roll_out(snake, (direction,)):
+                    distance = -1
+                    if not snake.game_over:
+                        path = self.find_path(snake, snake.body[-1])
+                        distance = -2 if path is None else len(path)
+                    if best_distance is None or distance > best_distance:
+                        best, best_distance = index, distance
+                snake.restore(state)
+            return best
+        finally:
+            snake.restore(state)
+            snake.release(state)
+
+    def respond(self, snake):
+        """ makes snake take its chosen move """
+        y = zeros(3)
+        y[self.choose(snake)] = 1
+        snake.respond(y)
+
+    def play(self, snake):
+        """ plays snake's game until it is over, without drawing """
+        while not snake.game_over:
+            snake.update()
+            if snake.game_over:
+                snake.score -= snake.delta_distance
+                break
+            self.respond(snake)
+        return snake.score
@@ -1,100 +1,163 @@
+from collections import deque, namedtuple
+
 from objects import Ground, Food
-from utilities import Direction, Color
+from utilities import DELTAS, Direction, Color
 from math import sqrt, pow
 
-import pygame
 from numpy import array, concatenate, int32, random, ravel, reshape, zeros, argmax
 
 
+# cell in body for a head that left the grid
+OUTSIDE = -1
+
+# state of a snake's game captured by Snake.snapshot
+State = namedtuple('State', (
+    'body', 'head', 'direction', 'food', 'score', 'movement_score', 'items_consumed', 'steps',
+    'game_over', 'won', 'delta_distance', 'features', 'random_state', 'journal',
+    'steps_since_food', 'visited', 'body_hash',
+))
+
+# rules ending games that stall: moves only depend on body, direction and food, so a snake
+# back in a state it was in since it last ate is looping forever, its game ends losing
+# loop_penalty. a game also ends after max_steps_since_food ticks without food,
+# as many as the board has cells if not given
+Rules = namedtuple('Rules', ('detect_loops', 'loop_penalty', 'max_steps_since_food'), defaults=(True, 100.0, None))
+
+
 class Snake:
-    def __init__(self):
+    __slots__ = (
+        'seed', 'score', 'movement_score', 'items_consumed', 'steps', 'game_over', 'won', 'threshold_movement_score',
+        'ground', 'body', 'head', 'direction', 'food', 'delta_distance', 'features',
+        'rules', 'max_steps_since_food', 'steps_since_food', 'visited', 'body_hash',
+    )
+
+    def __init__(self, seed=None, ground=None, rules=None):
+        self.seed = seed
         self.score = 0
         self.movement_score = 0
         self.items_consumed = 0                  
+        self.steps = 0                   # ticks played
         self.game_over = False
+        self.won = False
         self.threshold_movement_score = -25
 
-        # ground objects
-        self.ground = Ground()
+        # ground objects, an empty ground can be reused
+        self.ground = ground or Ground()
+        self.features = None
+
+        # hashes of states since snake last ate
+        self.rules = rules or Rules()
+        self.max_steps_since_food = self.rules.max_steps_since_food or self.ground.rows * self.ground.columns
+        self.steps_since_food = 0
+        self.visited = set()
 
-        # center of board
-        board_center = (int(self.ground.columns/2), int(self.ground.rows/2))
-        # body is a list of parts
-        self.body = [
-            {
-                'origin' : board_center,
-                'direction' : Direction.UP,
-                'length' : 5,
-            },
-        ]
+        # snake of length 5 starting at center of board heading up
+        # body holds packed cells from head to tail, head's point and direction are kept aside
+        x_, y_ = (int(self.ground.columns/2), int(self.ground.rows/2))
+        length = 5
+        self.direction = Direction.UP
+        self.head = (x_, y_ - length + 1)
+        self.body = deque()
 
         # marking all points of snake on grid
-        points = self.find_all_points(self.body[0])
-        for point in points:
+        for i in range(length):
+            point = (x_, y_ - i)
+            self.body.appendleft(self.ground.pack(*point))
             self.mark_ground(point, 1)
+        self.body_hash = self.hash_body()
         
         # food object
-        self.food = Food()
+        self.food = Food(seed)
         self.food.get_new_position(self.ground)
 
         # distance between snake and food
         self.delta_distance = self.find_distance(
             self.food.get_current_position(),
-            self.find_end_point(self.body[0])
+            self.head
         )
     
-    def reset(self):
-        """ reset's snake object by calling it's constructor """
-        self.__init__()
-
+    def reset(self, seed=None):
+        """ reset's snake object by calling it's constructor, clearing only snake's cells off its ground """
+        for cell in self.body:
+            self.mark_ground(self.ground.unpack(cell), 0)
+        self.ground.reset_free_cells()
+        self.__init__(seed, self.ground, self.rules)
+
+    def snapshot(self):
+        """
+        captures state of the game, body is captured as packed cells while the ground only
+        records changes from now on, so that capturing takes no copy of the board
+        """
+        return State(
+            tuple(self.body), self.head, self.direction, self.food.get_current_position(),
+            self.score, self.movement_score, self.items_consumed, self.steps, self.game_over, self.won,
+            self.delta_distance, self.features, self.food.random.get_state(), self.ground.start_journal(),
+            self.steps_since_food, set(self.visited), self.body_hash,
+        )
 
-    def create_part(self, origin, direction, length):
-        """ return new part with specified attributes """
-        part = {
-            'origin' : origin,
-            'direction' : direction, 
-            'length' : length,
-        }
-        return part
+    def restore(self, state):
+        """ brings game back to a captured state, undoing changes of the ground since then """
+        self.ground.undo(state.journal)
+        self.body = deque(state.body)
+        self.head = state.head
+        self.direction = state.direction
+        self.food.x_, self.food.y_ = state.food
+        self.score = state.score
+        self.movement_score = state.movement_score
+        self.items_consumed = state.items_consumed
+        self.steps = state.steps
+        self.game_over = state.game_over
+        self.won = state.won
+        self.delta_distance = state.delta_distance
+        self.features = state.features
+        self.food.random.set_state(state.random_state)
+        self.steps_since_food = state.steps_since_food
+        self.visited = set(state.visited)
+        self.body_hash = state.body_hash
+
+    def release(self, state):
+        """ lets go of a captured state that won't be restored anymore """
+        self.ground.stop_journal(state.journal)
 
     def update(self):
         """
-        if body has only one part then shift the origin in it's current direction
-        else if it has more than one part then
-            - increase size of head by one
-            - decrease size of tail by 1 and after decreasing tail's length,
-              if tail's length is zero then delete that part
+        moves head one cell in current direction and drops the tail's last cell
         """
-        body_size = len(self.body)
+        self.steps += 1
+        self.steps_since_food += 1
+        # features are found again once asked for
+        self.features = None
         # marking ground before moving
-        self.mark_ground(self.body[-1]['origin'], 0)
+        tail = self.body.pop()
+        self.mark_ground(self.ground.unpack(tail), 0)
+        self.body_hash ^= hash((tail, self.body[-1] - tail))
 
-        # if snake is made of only one part
-        if body_size == 1:
-            head = self.body[0]
-            self.body[0] = self.shift_origin(head)
-        # if snake is made up of more than one part
-        else:
-            self.increase_head_length()
-            self.decrease_tail_length()
-        
         # marking ground after moving
-        self.mark_ground((self.find_end_point(self.body[0])), 1)
+        self.push_head()
 
-        # if food is consumed, then increase the length of head by two and mark the grid as well
+        # if food is consumed, then head grows by one more cell and grid is marked as well
         # then find new position for food
         if self.consumed_food():
             self.items_consumed += 1
             self.score += self.food.value
+            self.steps_since_food = 0
+            self.visited.clear()
             # increases the length of snake body
-            self.body[0]['length'] += 1
-            self.mark_ground((self.find_end_point(self.body[0])), 1)
-            # set new position for food
-            self.food.get_new_position(self.ground)
+            self.push_head()
+            # set new position for food, if there is no free cell left snake has won
+            if self.food.get_new_position(self.ground) is None:
+                self.won = True
+                self.game_over = True
+                self.delta_distance = 0
+                return
 
         # check if head of snake lies inside the grid
-        head_point = self.find_end_point(self.body[0])
-        if not self.ground.is_inside_grid(*head_point) or self.movement_score < self.threshold_movement_score:
+        if not self.ground.is_inside_grid(*self.head) or self.movement_score < self.threshold_movement_score:
+            self.game_over = True
+            return
+
+        # ending games that loop or go on too long without food
+        if not self.game_over and self.is_stalled():
             self.game_over = True
             return
 
@@ -102,7 +165,7 @@ class Snake:
         # and score related to it as well
         current_delta_distance = self.find_distance(
             self.food.get_current_position(),
-            self.find_end_point(self.body[0])
+            self.head
         )
         if current_delta_distance < self.delta_distance:
             self.movement_score += 1
@@ -110,76 +173,76 @@ class Snake:
             self.movement_score -= 1.5
 
         self.delta_distance = current_delta_distance
-        
-        # features for snake's neural network
-        self.features = concatenate((
-            self.get_wall_distances(),
-            self.get_body_distances(),
-            self.get_food_distances(),
-        ))
-    
+
+    def is_stalled(self):
+        """ checks if snake is repeating a state since it last ate, taking off loop penalty, or went too long without food """
+        if self.rules.detect_loops:
+            state = hash((self.body_hash, self.direction.value))
+            if state in self.visited:
+                self.score -= self.rules.loop_penalty
+                return True
+            self.visited.add(state)
+        return self.steps_since_food > self.max_steps_since_food
+
+    def hash_body(self):
+        """
+        hashes body as xor of keys of its cells each linked to the cell in front of it, head linked
+        to itself, so that the order of cells counts. push_head and update keep it up to date
+        """
+        body_hash, front = 0, self.body[0]
+        for cell in self.body:
+            body_hash ^= hash((cell, front - cell))
+            front = cell
+        return body_hash
+
+    def push_head(self):
+        """ adds a new head one cell ahead in current direction and marks it on grid """
+        x_, y_ = self.head
+        deltax, deltay = DELTAS[self.direction]
+        self.head = (x_ + deltax, y_ + deltay)
+        if self.ground.is_inside_grid(*self.head):
+            head, new_head = self.body[0], self.ground.pack(*self.head)
+            # old head is now linked to the new one
+            self.body_hash ^= hash((head, 0)) ^ hash((head, new_head - head)) ^ hash((new_head, 0))
+            self.body.appendleft(new_head)
+        else:
+            self.body.appendleft(OUTSIDE)
+        self.mark_ground(self.head, 1)
     
     def get_wall_distances(self):
-        head = self.body[0]
-        deltas = Direction.get_relative_deltas(head['direction'])[:3]
+        deltas = Direction.get_relative_deltas(self.direction)[:3]
 
-        distances = [self.find_wall_distance_in_direction(head, delta) for delta in deltas]
+        distances = [self.find_wall_distance_in_direction(delta) for delta in deltas]
         distances = array(distances)
         distances = distances / self.ground.diagonal
         distances = reshape(distances, (len(deltas), 1))
         return distances
     
 
-    def find_wall_distance_in_direction(self, head, delta):
-        x_, y_ = self.find_end_point(head)
-        deltax, deltay = delta
-        distance = 0
-        while True:
-            x_ += deltax
-            y_ += deltay
-            if self.ground.is_inside_grid(x_, y_):
-                if abs(deltax) == 1 and abs(deltay) == 1:
-                    distance += sqrt(2)
-                else:
-                    distance += 1
-            else:
-                return distance
-        return distance
+    def find_wall_distance_in_direction(self, delta):
+        x_, y_ = self.head
+        return self.ground.find_wall_distance(x_, y_, *delta)
     
     def get_body_distances(self):
-        head = self.body[0]
-        deltas = Direction.get_relative_deltas(head['direction'])
+        deltas = Direction.get_relative_deltas(self.direction)
 
-        distances = [self.find_body_distance_in_direction(head, delta) for delta in deltas]
+        distances = [self.find_body_distance_in_direction(delta) for delta in deltas]
         distances = array(distances)
         distances = distances / self.ground.diagonal
         distances = reshape(distances, (len(deltas), 1))
         return distances
     
-    def find_body_distance_in_direction(self, head, delta):
-        x_, y_ = self.find_end_point(head)
-        deltax, deltay = delta
-        distance = 0
-        while True:
-            x_ += deltax
-            y_ += deltay
-            if self.ground.is_inside_grid(x_, y_):
-                if self.ground.grid[y_][x_] != 1:
-                    if abs(deltax) == 1 and abs(deltay) == 1:
-                        distance += sqrt(2)
-                    else:
-                        distance += 1
-                else:
-                    return distance
-            # if it doesn't hits its body in this direction
-            else:
-                return -self.ground.diagonal
+    def find_body_distance_in_direction(self, delta):
+        x_, y_ = self.head
+        distance = self.ground.find_occupied_distance(x_, y_, *delta)
+        # if it doesn't hits its body in this direction
+        if distance is None:
+            return -self.ground.diagonal
         return distance
 
     def get_food_distances(self):
-        head = self.body[0]
-        direction = head['direction']
-        xs, ys = self.find_end_point(head)
+        direction = self.direction
+        xs, ys = self.head
         xf, yf = self.food.get_current_position()
 
         if direction == Direction.UP or direction == Direction.DOWN:
@@ -205,143 +268,73 @@ class Snake:
         return sqrt(pow(x1-x2, 2) + pow(y1-y2, 2))
 
     def get_features(self):
-        """ return feature vector X for neural network """
+        """ return feature vector X for neural network, found on first call after each update """
+        if self.features is None:
+            self.features = self.find_features()
         return self.features
 
+    def find_features(self):
+        """ features for snake's neural network, distances to walls, body and food """
+        return concatenate((
+            self.get_wall_distances(),
+            self.get_body_distances(),
+            self.get_food_distances(),
+        ))
+
     def respond(self, y):
-        # finding relative directions
-        current_direction = self.body[0]['direction']
-        left_direction = Direction.get_direction_to_left(current_direction)
-        right_direction = Direction.get_opposite_direction(left_direction)
-        
+        """ moves according to network's output y, returns index of move made """
         # One Vs All for multiclass neural network
         index = argmax(y)
         if y[index] > 0.5:
-            if index == 0:
-                self.move(left_direction)
-            elif index == 1:
-                self.move(current_direction)
-            elif index == 2:
-                self.move(right_direction)
+            self.turn(index)
+            return index
+        # keeps going straight
+        return 1
 
-    def consumed_food(self):
-        """ checks if snake has consumed new food """
-        # first index for body's head
-        head = self.body[0]
-        head_point = self.find_end_point(head)
-        if head_point == self.food.get_current_position():
-            return True
-        return False
-
-    def increase_head_length(self):
-        """ increase size of head by 1 """
-        self.body[0]['length'] += 1
-    
-    def decrease_tail_length(self):
-        """ decrease size of tail by 1 """
-        self.body[-1]['length'] -= 1
-        # shift origin of last part by one unit
-        self.body[-1] = self.shift_origin(self.body[-1])
-        # if tail length is zero, then delete it
-        if self.body[-1]['length'] <= 0:
-            del self.body[-1]
-    
-    def shift_origin(self, part, delta=1):
-        """ shifts origin of the part by amount of delta units """
-        x_, y_ = part['origin']
-        direction = part['direction']
-        length = part['length']
-
-        if direction == Direction.LEFT:
-            origin = (x_ - delta, y_)
-        elif direction == Direction.RIGHT:
-            origin = (x_ + delta, y_)
-        elif direction == Direction.UP:
-            origin = (x_, y_ - delta)
-        elif direction == Direction.DOWN:
-            origin = (x_, y_ + delta)
-
-        new_part = self.create_part(origin, direction, length)
-        return new_part
-    
-    def find_end_point(self, part):
-        """ finds end point of the part other than origin """
-        x_, y_ = part['origin']
-        length = part['length'] - 1
-        direction = part['direction']
-
-        if direction == Direction.LEFT:
-            end_point = (x_ - length, y_,)
-        elif direction == Direction.RIGHT:
-            end_point = (x_ + length, y_,)
-        elif direction == Direction.UP:
-            end_point = (x_, y_ - length,)
-        elif direction == Direction.DOWN:
-            end_point = (x_, y_ + length,)    
-
-        return end_point
-    
-    def find_all_points(self, part):
-        """ returns all the points included for a given part """
-        x_, y_ = part['origin']
-        length = part['length']
-        direction = part['direction']
-
-        # stores array of points
-        points = []
-
-        # creates points array
-        for i in range(length):
-            if direction == Direction.LEFT:
-                point = (x_ - i, y_)
-            elif direction == Direction.RIGHT:
-                point = (x_ + i, y_)
-            elif direction == Direction.UP:
-                point = (x_, y_ - i)
-            elif direction == Direction.DOWN:
-                point = (x_, y_ + i)
-            points.append(point)
-
-        return points
+    def turn(self, index):
+        """ makes move of given index, 0 for left, 1 for straight and 2 for right """
+        # finding relative directions
+        current_direction = self.direction
+        left_direction = Direction.get_direction_to_left(current_direction)
+        right_direction = Direction.get_opposite_direction(left_direction)
 
+        if index == 0:
+            self.move(left_direction)
+        elif index == 1:
+            self.move(current_direction)
+        elif index == 2:
+            self.move(right_direction)
 
+    def consumed_food(self):
+        """ checks if snake has consumed new food """
+        return self.head == self.food.get_current_position()
 
     def move(self, new_direction):
         """
         if new-direction == current/opposite to head-direction then return
-        else, add new part at the start of list
-        reduce the length of current head by 1
-        new part = (find_end_point(previous-head), new-direction, 1)
-
-
+        else, head continues in new-direction from next update
         """
-        head = self.body[0]
-        is_same_direction = (head['direction'] == new_direction)
-        is_opposite_direction =  (new_direction == Direction.get_opposite_direction(head['direction']))
+        is_same_direction = (self.direction == new_direction)
+        is_opposite_direction =  (new_direction == Direction.get_opposite_direction(self.direction))
         
         if is_same_direction or is_opposite_direction:
             return
         else:
-            end_point = self.find_end_point(head)
-            # creating new head of length 1
-            new_head = self.create_part(end_point, new_direction, 1)
-            # reducing the length of current head by 1
-            self.body[0]['length'] -= 1
-            # appending the new head to the snake's body
-            self.body = [new_head] + self.body
+            self.direction = new_direction
     
     def draw(self, screen):
+        # pygame is only needed once something is drawn, simulation runs without it
+        import pygame
+
         # draw food
         point = self.food.get_current_position()
         rect = self.ground.get_rect(point, point)
         pygame.draw.rect(screen, Color.RED, rect)
 
-        # draw snake's parts
-        for part in self.body:
-            """ for each part find rectangle and draw it using pygame draw function """
-            p1 = part['origin']
-            p2 = self.find_end_point(part)
-            rect = self.ground.get_rect(p1, p2)
+        # draw snake's cells
+        for cell in self.body:
+            point = self.ground.unpack(cell)
+            rect = self.ground.get_rect(point, point)
             pygame.draw.rect(screen, Color.WHITE, rect)
     
     def mark_ground(self, point, value):
@@ -353,7 +346,7 @@ class Snake:
             and again trying to occupy, then game over
 
             """
-            if value == 1 and self.ground.grid[y_][x_] == 1:
+            if value == 1 and self.ground.is_occupied(x_, y_):
                 self.game_over = True
-            self.ground.grid[y_][x_] = value
+            self.ground.mark(x_, y_, value)
     
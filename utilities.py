@@ -56,23 +56,7 @@ class Direction(Enum):
         return directions
     
     def get_relative_deltas(current_direction):
-        directions = Direction.get_relative_directions(current_direction)
-    
-        DELTAS = {
-            Direction.LEFT : (-1, 0),
-            Direction.RIGHT : (1, 0),
-            Direction.UP : (0, -1),
-            Direction.DOWN : (0, 1),
-            Direction.LEFT_UP : (-1, -1),
-            Direction.LEFT_DOWN : (-1, 1),
-            Direction.RIGHT_UP : (1, -1),
-            Direction.RIGHT_DOWN : (1, 1),
-        }
-
-        deltas = []
-        for direction in directions:
-            deltas.append(DELTAS[direction])
-        return deltas
+        return RELATIVE_DELTAS[current_direction]
 
     def combine(dir1, dir2):
         if dir1 == Direction.LEFT or dir2 == Direction.LEFT:
@@ -87,6 +71,24 @@ class Direction(Enum):
                 return Direction.RIGHT_DOWN
 
 
+DELTAS = {
+    Direction.LEFT : (-1, 0),
+    Direction.RIGHT : (1, 0),
+    Direction.UP : (0, -1),
+    Direction.DOWN : (0, 1),
+    Direction.LEFT_UP : (-1, -1),
+    Direction.LEFT_DOWN : (-1, 1),
+    Direction.RIGHT_UP : (1, -1),
+    Direction.RIGHT_DOWN : (1, 1),
+}
+
+# deltas of directions relative to each direction snake can move in, built once
+RELATIVE_DELTAS = {
+    direction : tuple(DELTAS[d] for d in Direction.get_relative_directions(direction))
+    for direction in (Direction.LEFT, Direction.RIGHT, Direction.UP, Direction.DOWN)
+}
+
+
 class Color:
     RED = (255,0,0)
     GREEN = (0,255,0)